@@ -1,6 +1,13 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Optional
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from sqlalchemy import select, func
+from sqlalchemy import insert, select, func, literal, text
 
 from models import (
     ConversationAuditLog,
@@ -8,13 +15,30 @@ from models import (
     DeletionAuditLog,
     PIIDetectionLog,
     User,
-    Role,
 )
-from pii_detector import scan_audit_log_for_pii
+from database import SessionLocal
+from pii_detector import scan_audit_logs_for_pii
+
+# Retention applied to tenants without a TenantRetention row
+DEFAULT_RETENTION_DAYS = 90
+
+# Advisory lock key shared by every worker that may run retention cleanup
+RETENTION_LOCK_KEY = 7_301_115
 
 
 # ============ USER MANAGEMENT ============
 
+# username -> (role, expires_at) for the per-request auth lookup
+USER_CACHE_TTL_SECONDS = 60
+USER_CACHE_MAXSIZE = 1024
+_user_role_cache = {}
+_user_role_cache_lock = threading.Lock()
+
+
+def _invalidate_user_cache(username: str):
+    with _user_role_cache_lock:
+        _user_role_cache.pop(username, None)
+
 
 def create_user(db: Session, username: str, role: str = "viewer") -> User:
     """Create a new user with a specified role (default: viewer)."""
@@ -26,6 +50,7 @@ def create_user(db: Session, username: str, role: str = "viewer") -> User:
     db.add(user)
     db.commit()
     db.refresh(user)
+    _invalidate_user_cache(username)
     return user
 
 
@@ -34,6 +59,29 @@ def get_user_by_username(db: Session, username: str) -> User:
     return db.query(User).filter(User.username == username).first()
 
 
+def get_user_role(db: Session, username: str) -> Optional[str]:
+    """
+    Role of a user, or None if the user does not exist.
+    Found users are cached for USER_CACHE_TTL_SECONDS so authenticated
+    requests skip the users lookup; user changes invalidate the entry.
+    """
+    now = time.monotonic()
+    with _user_role_cache_lock:
+        cached = _user_role_cache.get(username)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+
+    role = db.execute(
+        select(User.role).where(User.username == username)
+    ).scalar_one_or_none()
+    if role is not None:
+        with _user_role_cache_lock:
+            if len(_user_role_cache) >= USER_CACHE_MAXSIZE:
+                _user_role_cache.clear()
+            _user_role_cache[username] = (role, now + USER_CACHE_TTL_SECONDS)
+    return role
+
+
 def get_all_users(db: Session):
     """Get all users."""
     return db.query(User).all()
@@ -44,8 +92,10 @@ def delete_user(db: Session, user_id: str) -> bool:
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         return False
+    username = user.username
     db.delete(user)
     db.commit()
+    _invalidate_user_cache(username)
     return True
 
 
@@ -57,36 +107,184 @@ def promote_user_to_admin(db: Session, username: str) -> User:
     user.role = "admin"
     db.commit()
     db.refresh(user)
+    _invalidate_user_cache(username)
     return user
 
 
-def create_log(db: Session, data):
-    """Create audit log and scan for PII."""
-    log = ConversationAuditLog(timestamp=datetime.utcnow(), **data.dict())
-    db.add(log)
+def create_logs_bulk(db: Session, items) -> list:
+    """
+    Create many audit logs in one INSERT ... RETURNING round trip.
+    Returns (id, timestamp) rows in input order. PII scanning is not done
+    here; callers schedule scan_and_store_pii or scan_and_store_pii_batch so
+    the request does not wait on the NER model.
+    """
+    now = datetime.utcnow()
+    rows = db.execute(
+        insert(ConversationAuditLog).returning(
+            ConversationAuditLog.id,
+            ConversationAuditLog.timestamp,
+            sort_by_parameter_order=True,
+        ),
+        [{"timestamp": now, **item.model_dump(by_alias=True)} for item in items],
+    ).all()
     db.commit()
-    db.refresh(log)
-
-    # Scan for PII
-    pii_results = scan_audit_log_for_pii(data.prompt, data.response)
-
-    # Store PII detection results
-    if pii_results["total_pii_found"] > 0 or pii_results["high_risk_count"] > 0:
-        pii_log = PIIDetectionLog(
-            audit_log_id=log.id,
-            tenant_id=data.tenant_id,
-            pii_detected=pii_results["pii_list"],
-            pii_count=pii_results["total_pii_found"],
-            fields_scanned=pii_results["fields_scanned"],
-            ner_response_prompt=pii_results.get("ner_response_prompt"),
-            ner_response_response=pii_results.get("ner_response_response"),
-        )
-        db.add(pii_log)
-        db.commit()
+    return rows
+
+
+# Single-log writes are coalesced into bulk inserts by AuditWriter
+AUDIT_WRITE_MAX_BATCH = int(os.getenv("AUDIT_WRITE_MAX_BATCH", "500"))
+AUDIT_WRITE_MAX_WAIT_SECONDS = float(os.getenv("AUDIT_WRITE_MAX_WAIT_MS", "10")) / 1000
+# How long a log may wait in the queue before its caller gives up (TimeoutError)
+AUDIT_WRITE_TIMEOUT_SECONDS = float(os.getenv("AUDIT_WRITE_TIMEOUT_SECONDS", "10"))
+
+
+class AuditWriter:
+    """
+    Coalesces concurrent single-log writes.
+    Callers block in submit(); a worker thread takes the first pending log,
+    gathers whatever else arrives within max_wait (up to max_batch), and
+    writes them with one create_logs_bulk call on its own session.
+    """
+
+    def __init__(self, max_batch: int, max_wait: float, timeout: float):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def submit(self, data):
+        """
+        Insert one log; returns its (id, timestamp) row.
+        Raises concurrent.futures.TimeoutError if the write has not started
+        within timeout; the log is then dropped, never written.
+        """
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((data, future))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                raise
+        # Already being inserted: the worker resolves it either way
+        return future.result()
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, daemon=True, name="audit-writer"
+                )
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # Callers that timed out have cancelled theirs; skip those logs
+            batch = [
+                (data, future)
+                for data, future in batch
+                if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+            try:
+                self._write(batch)
+            except Exception as e:
+                # Keep the worker alive; fail whoever is still waiting on this batch
+                print(f"[Audit Writer] Failed to write {len(batch)} logs: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _write(self, batch):
+        db = SessionLocal()
+        try:
+            rows = create_logs_bulk(db, [data for data, _ in batch])
+            for (_, future), row in zip(batch, rows):
+                future.set_result(row)
+            return
+        except Exception as e:
+            db.rollback()
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+        finally:
+            db.close()
 
-    return log
+        # One bad log must not fail everyone else's write: retry individually
+        for item in batch:
+            self._write([item])
 
-    return log
+
+audit_writer = AuditWriter(
+    AUDIT_WRITE_MAX_BATCH, AUDIT_WRITE_MAX_WAIT_SECONDS, AUDIT_WRITE_TIMEOUT_SECONDS
+)
+
+
+def scan_and_store_pii(log_id, tenant_id: str, prompt: str, response: str):
+    """
+    Scan an audit log for PII and store the findings.
+    Runs after the response is sent, so it uses its own session.
+    """
+    scan_and_store_pii_batch([(log_id, tenant_id, prompt, response)])
+
+
+def scan_and_store_pii_batch(jobs):
+    """
+    Scan several audit logs for PII and store all findings in one commit.
+    Each job is a (log_id, tenant_id, prompt, response) tuple.
+    """
+    # All logs are scanned together so their NER calls share requests
+    scans = scan_audit_logs_for_pii(
+        [(prompt, response) for _, _, prompt, response in jobs]
+    )
+    pii_logs = []
+    for (log_id, tenant_id, _, _), pii_results in zip(jobs, scans):
+        if pii_results["total_pii_found"] == 0 and pii_results["high_risk_count"] == 0:
+            continue
+        pii_type_counts = Counter(
+            "unknown" if item.get("type") is None else item["type"]
+            for item in pii_results["pii_list"]
+        )
+        pii_logs.append(
+            PIIDetectionLog(
+                audit_log_id=log_id,
+                tenant_id=tenant_id,
+                pii_detected=pii_results["pii_list"],
+                pii_count=pii_results["total_pii_found"],
+                high_risk_count=pii_results["high_risk_count"],
+                pii_type_counts=dict(pii_type_counts),
+                fields_scanned=pii_results["fields_scanned"],
+                ner_response_prompt=pii_results.get("ner_response_prompt"),
+                ner_response_response=pii_results.get("ner_response_response"),
+            )
+        )
+    if not pii_logs:
+        return
+
+    db = SessionLocal()
+    try:
+        db.add_all(pii_logs)
+        db.commit()
+    except Exception as e:
+        print(f"[PII] Failed to store PII findings for {len(pii_logs)} logs: {e}")
+        db.rollback()
+    finally:
+        db.close()
 
 
 def get_retention_for_tenant(db: Session, tenant_id: str) -> int:
@@ -96,7 +294,7 @@ def get_retention_for_tenant(db: Session, tenant_id: str) -> int:
         )
     ).scalar_one_or_none()
     if row is None:
-        return 90  # default retention
+        return DEFAULT_RETENTION_DAYS
     return int(row)
 
 
@@ -122,27 +320,45 @@ def run_retention_cleanup(db: Session):
     perform actual deletions. Purging must be handled at database level (e.g., via
     external scripts or manual DB operations).
 
+    Only one caller runs at a time: a transaction-scoped advisory lock is taken
+    first and a concurrent caller returns an empty list instead of duplicating work.
+
     Returns list of deletion audit records created (metadata only, no actual deletions).
     """
-    # Find distinct tenants in ConversationAuditLog
-    tenants = [
-        r[0]
-        for r in db.execute(select(ConversationAuditLog.tenant_id).distinct()).all()
-    ]
-    audits = []
+    acquired = db.execute(
+        text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": RETENTION_LOCK_KEY}
+    ).scalar()
+    if not acquired:
+        print("[Retention Audit] Cleanup already running elsewhere; skipping")
+        db.rollback()
+        return []
+
     now = datetime.utcnow()
-    for tenant in tenants:
-        retention = get_retention_for_tenant(db, tenant)
-        cutoff = now - timedelta(days=retention)
+    retention_days = func.coalesce(
+        TenantRetention.retention_days, DEFAULT_RETENTION_DAYS
+    )
+    tenant_cutoff = literal(now) - func.make_interval(0, 0, 0, retention_days)
 
-        # Count how many rows WOULD be deleted (for audit purposes only)
-        count_res = db.execute(
-            select(func.count(ConversationAuditLog.id)).where(
-                ConversationAuditLog.tenant_id == tenant,
-                ConversationAuditLog.timestamp < cutoff,
-            )
-        ).scalar()
-        would_delete_count = count_res or 0
+    # One grouped aggregate: every tenant with its retention and the number
+    # of rows older than its own cutoff
+    tenant_counts = db.execute(
+        select(
+            ConversationAuditLog.tenant_id,
+            retention_days,
+            func.count(ConversationAuditLog.id).filter(
+                ConversationAuditLog.timestamp < tenant_cutoff
+            ),
+        )
+        .select_from(ConversationAuditLog)
+        .outerjoin(
+            TenantRetention,
+            TenantRetention.tenant_id == ConversationAuditLog.tenant_id,
+        )
+        .group_by(ConversationAuditLog.tenant_id, TenantRetention.retention_days)
+    ).all()
+    audits = []
+    for tenant, retention, would_delete_count in tenant_counts:
+        cutoff = now - timedelta(days=retention)
 
         # NOTE: We do NOT actually delete because ConversationAuditLog is immutable.
         # Record the audit entry for compliance purposes.
@@ -153,11 +369,13 @@ def run_retention_cleanup(db: Session):
             deleted_count=would_delete_count,  # Records what would have been deleted
             run_timestamp=now,
         )
-        db.add(audit)
-        db.commit()
         audits.append(audit)
         print(
             f"[Retention Audit] Tenant {tenant}: {would_delete_count} records older than {cutoff} (not deleted - logs are immutable)"
         )
 
+    # Flushed as one batched INSERT
+    db.add_all(audits)
+    db.commit()
+
     return audits
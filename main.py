@@ -1,16 +1,39 @@
-from fastapi import FastAPI, Depends, Request, HTTPException, Header, Response
+from fastapi import (
+    FastAPI,
+    BackgroundTasks,
+    Body,
+    Depends,
+    Request,
+    HTTPException,
+    Header,
+    Query,
+    Response,
+)
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse
+from sqlalchemy import Integer, cast, func, true, tuple_
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import OperationalError
+import asyncio
+import base64
+import os
+import uuid
+import orjson
 import time
-import threading
+from anyio import to_thread
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime
 from typing import Optional
 
-from database import SessionLocal, engine
-from models import Base, ConversationAuditLog, PIIDetectionLog, User
+from database import SessionLocal, engine, prime_pool
+from models import (
+    Base,
+    ConversationAuditLog,
+    DeletionAuditLog,
+    PIIDetectionLog,
+    User,
+)
 from schemas import (
     AuditLogCreate,
     AuditLogResponse,
@@ -19,9 +42,14 @@ from schemas import (
     UserResponse,
 )
 from crud import (
-    create_log,
+    AUDIT_WRITE_MAX_BATCH,
+    audit_writer,
+    create_logs_bulk,
+    scan_and_store_pii,
+    scan_and_store_pii_batch,
     create_user,
     get_user_by_username,
+    get_user_role,
     get_all_users,
     promote_user_to_admin,
 )
@@ -31,14 +59,26 @@ from crud import (
     run_retention_cleanup,
 )
 from schemas import RetentionUpdate, DeletionAuditRecord
-from compliance_export import generate_compliance_export
+from compliance_export import stream_compliance_export
+
+# orjson encodes the large list responses much faster than stdlib json
+app = FastAPI(
+    title="Conversation Audit Logs Demo", default_response_class=ORJSONResponse
+)
 
-app = FastAPI(title="Conversation Audit Logs Demo")
+# Worker threads shared by sync endpoints and the streamed export body
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "100"))
+
+# In-process retention schedule; 0 leaves cleanup to an external scheduler
+RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", "0"))
 
 # Serve static files and templates for a small dashboard UI
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
+# The dashboard takes no per-request data, so it is rendered once per process
+_INDEX_HTML = templates.get_template("index.html").render(request=None)
+
 
 # Dependency
 def get_db():
@@ -66,11 +106,11 @@ def get_current_user(request: Request, db: Session = Depends(get_db)) -> Current
     if not username:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    user = get_user_by_username(db, username)
-    if not user:
+    role = get_user_role(db, username)
+    if role is None:
         raise HTTPException(status_code=401, detail="User not found")
 
-    return CurrentUser(username=user.username, role=user.role)
+    return CurrentUser(username=username, role=role)
 
 
 @app.post("/auth/login")
@@ -89,13 +129,13 @@ def auth_login(payload: UserCreate, response: Response, db: Session = Depends(ge
 
 
 @app.post("/auth/logout")
-def auth_logout(response: Response):
+async def auth_logout(response: Response):
     response.delete_cookie("session_user")
     return {"message": "logged out"}
 
 
 @app.get("/auth/me", response_model=CurrentUser)
-def auth_me(current_user: CurrentUser = Depends(get_current_user)):
+async def auth_me(current_user: CurrentUser = Depends(get_current_user)):
     return current_user
 
 
@@ -134,36 +174,48 @@ def startup_event():
     else:
         raise Exception("❌ Database not available after retries")
 
-    # Run an immediate cleanup once at startup for any overdue logs
-    try:
-        db = SessionLocal()
+    prime_pool()
+
+
+@app.on_event("startup")
+async def configure_threadpool():
+    # AnyIO's default limiter caps concurrent sync requests at 40
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+
+def _run_retention_once():
+    with SessionLocal() as db:
         run_retention_cleanup(db)
-    finally:
-        db.close()
 
-    # Start background thread to run retention cleanup once every 24 hours
-    def retention_loop():
-        interval_seconds = 24 * 60 * 60
-        while True:
-            try:
-                db = SessionLocal()
-                run_retention_cleanup(db)
-            except Exception as e:
-                print("Retention cleanup failed:", e)
-            finally:
-                try:
-                    db.close()
-                except Exception:
-                    pass
-            time.sleep(interval_seconds)
 
-    t = threading.Thread(target=retention_loop, daemon=True, name="retention-cleaner")
-    t.start()
+async def _retention_loop(interval_seconds: float):
+    # Sleeps on the event loop; only the cleanup itself borrows a worker thread
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await to_thread.run_sync(_run_retention_once)
+        except Exception as e:
+            print("Retention cleanup failed:", e)
+
+
+@app.on_event("startup")
+async def schedule_retention():
+    if RETENTION_INTERVAL_HOURS > 0:
+        app.state.retention_task = asyncio.create_task(
+            _retention_loop(RETENTION_INTERVAL_HOURS * 60 * 60)
+        )
 
 
-@app.get("/")
-def dashboard(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+@app.on_event("shutdown")
+async def stop_retention():
+    task = getattr(app.state, "retention_task", None)
+    if task is not None:
+        task.cancel()
+
+
+@app.get("/", response_class=HTMLResponse)
+async def dashboard():
+    return HTMLResponse(_INDEX_HTML, headers={"Cache-Control": "public, max-age=300"})
 
 
 # ============ USER MANAGEMENT ENDPOINTS ============
@@ -204,7 +256,7 @@ def list_users(
 
 
 @app.get("/users/me", response_model=CurrentUser)
-def get_current_user_info(current_user: CurrentUser = Depends(get_current_user)):
+async def get_current_user_info(current_user: CurrentUser = Depends(get_current_user)):
     """Get information about the currently authenticated user."""
     return current_user
 
@@ -222,25 +274,102 @@ def promote_to_admin(
     user = promote_user_to_admin(db, username)
     return {
         "message": f"User {username} promoted to admin",
-        "user": UserResponse.from_orm(user),
+        "user": UserResponse.model_validate(user),
     }
 
 
 @app.post("/audit/log", response_model=AuditLogResponse)
-def log_conversation(data: AuditLogCreate, db: Session = Depends(get_db)):
-    log = create_log(db, data)
+def log_conversation(data: AuditLogCreate, background_tasks: BackgroundTasks):
+    # Coalesced with concurrent requests into one INSERT ... RETURNING
+    try:
+        log = audit_writer.submit(data)
+    except FutureTimeoutError:
+        raise HTTPException(
+            status_code=503, detail="Audit log write timed out; the log was not stored"
+        )
+    # PII scan runs after the response is sent
+    background_tasks.add_task(
+        scan_and_store_pii, log.id, data.tenant_id, data.prompt, data.response
+    )
     return {"log_id": log.id, "timestamp": log.timestamp}
 
 
+@app.post("/audit/logs/batch", response_model=list[AuditLogResponse])
+def log_conversations_batch(
+    background_tasks: BackgroundTasks,
+    items: list[AuditLogCreate] = Body(..., max_length=AUDIT_WRITE_MAX_BATCH),
+    db: Session = Depends(get_db),
+):
+    """
+    Bulk ingestion: all logs are inserted in a single round trip.
+    At most AUDIT_WRITE_MAX_BATCH logs per request (422 above that).
+    """
+    if not items:
+        return []
+    rows = create_logs_bulk(db, items)
+    # One background task scans the whole batch
+    background_tasks.add_task(
+        scan_and_store_pii_batch,
+        [
+            (row.id, item.tenant_id, item.prompt, item.response)
+            for row, item in zip(rows, items)
+        ],
+    )
+    return [{"log_id": row.id, "timestamp": row.timestamp} for row in rows]
+
+
+def _encode_cursor(timestamp: datetime, row_id) -> str:
+    """Opaque keyset cursor for the row after which the next page starts."""
+    raw = orjson.dumps([timestamp.isoformat(), str(row_id)])
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        timestamp, row_id = orjson.loads(base64.urlsafe_b64decode(cursor))
+        if not isinstance(timestamp, str) or not isinstance(row_id, str):
+            raise ValueError("cursor fields must be strings")
+        return datetime.fromisoformat(timestamp), uuid.UUID(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @app.get("/audit/logs")
-def get_logs(tenant_id: str, db: Session = Depends(get_db)):
+def get_logs(
+    tenant_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Newest-first page of a tenant's logs; count is the tenant total.
+    Pass next_cursor back as cursor for the following page (keyset, no OFFSET scan).
+    """
+    query = db.query(ConversationAuditLog).filter(
+        ConversationAuditLog.tenant_id == tenant_id
+    )
+    count = query.with_entities(func.count(ConversationAuditLog.id)).scalar()
+
+    if cursor:
+        query = query.filter(
+            tuple_(ConversationAuditLog.timestamp, ConversationAuditLog.id)
+            < _decode_cursor(cursor)
+        )
     logs = (
-        db.query(ConversationAuditLog)
-        .filter(ConversationAuditLog.tenant_id == tenant_id)
-        .order_by(ConversationAuditLog.timestamp.desc())
+        query.order_by(
+            ConversationAuditLog.timestamp.desc(), ConversationAuditLog.id.desc()
+        )
+        .limit(limit)
+        .offset(offset)
         .all()
     )
-    return {"count": len(logs), "logs": logs}
+    next_cursor = (
+        _encode_cursor(logs[-1].timestamp, logs[-1].id)
+        if logs and len(logs) == limit
+        else None
+    )
+    return {"count": count, "logs": logs, "next_cursor": next_cursor}
 
 
 # Admin endpoints for retention management and audit viewing
@@ -252,89 +381,123 @@ def admin_set_retention(payload: RetentionUpdate, db: Session = Depends(get_db))
 
 
 @app.get("/admin/deletion-audits", dependencies=[Depends(require_role("admin"))])
-def admin_get_deletion_audits(tenant_id: str = None, db: Session = Depends(get_db)):
+def admin_get_deletion_audits(
+    tenant_id: str = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    """Newest-first page of deletion audits; count is the filtered total."""
     # NOTE: Endpoint is protected by admin role
-    q = db.query
-    from models import DeletionAuditLog
-
     q = db.query(DeletionAuditLog)
     if tenant_id:
         q = q.filter(DeletionAuditLog.tenant_id == tenant_id)
-    q = q.order_by(DeletionAuditLog.run_timestamp.desc())
-    results = q.all()
-    return {"count": len(results), "audits": results}
+    count = q.with_entities(func.count(DeletionAuditLog.id)).scalar()
+    results = (
+        q.order_by(DeletionAuditLog.run_timestamp.desc())
+        .limit(limit)
+        .offset(offset)
+        .all()
+    )
+    return {"count": count, "audits": results}
 
 
 @app.post("/admin/run-cleanup", dependencies=[Depends(require_role("admin"))])
 def admin_run_cleanup(db: Session = Depends(get_db)):
-    # NOTE: this endpoint is provided for demo/testing only. In production, cleanup must be non-user-triggered.
+    # Retention is driven by an external scheduler (see DEPLOYMENT_GUIDE.md) hitting
+    # this endpoint; run_retention_cleanup guards against concurrent runs.
     # Endpoint is protected by admin role
     audits = run_retention_cleanup(db)
     return {"count": len(audits), "audits": audits}
 
 
+# One (type, count) row per entry of PIIDetectionLog.pii_type_counts
+_pii_type_count = (
+    func.jsonb_each_text(PIIDetectionLog.pii_type_counts)
+    .table_valued("key", "value")
+    .alias("pii_type_count")
+)
+
+# Listing columns: the per-log aggregates instead of the JSON findings blobs
+_DETECTION_COLUMNS = (
+    PIIDetectionLog.id,
+    PIIDetectionLog.audit_log_id,
+    PIIDetectionLog.tenant_id,
+    PIIDetectionLog.detection_timestamp,
+    PIIDetectionLog.pii_count,
+    PIIDetectionLog.high_risk_count,
+    PIIDetectionLog.pii_type_counts,
+)
+
+
+def _has_risk_level(risk_level: str):
+    """True for detections with at least one finding at risk_level (GIN-indexed)."""
+    return PIIDetectionLog.pii_detected.contains([{"risk_level": risk_level}])
+
+
+def _detection_row(log) -> dict:
+    return {
+        "detection_id": str(log.id),
+        "audit_log_id": str(log.audit_log_id),
+        "tenant_id": log.tenant_id,
+        "timestamp": log.detection_timestamp,
+        "pii_count": log.pii_count,
+        "high_risk": log.high_risk_count > 0,
+        "pii_types": list(log.pii_type_counts),
+    }
+
+
 @app.get("/pii/summary")
 def get_pii_summary(tenant_id: str, db: Session = Depends(get_db)):
     """Get PII detection summary for a tenant."""
-    pii_logs = (
-        db.query(PIIDetectionLog)
+    # Aggregate statistics from the counts stored at write time
+    total_detections, high_risk_count = (
+        db.query(
+            func.count(PIIDetectionLog.id),
+            func.count(PIIDetectionLog.id).filter(PIIDetectionLog.high_risk_count > 0),
+        )
         .filter(PIIDetectionLog.tenant_id == tenant_id)
-        .order_by(PIIDetectionLog.detection_timestamp.desc())
-        .all()
+        .one()
     )
 
-    # Aggregate statistics
-    total_detections = len(pii_logs)
-    high_risk_count = sum(
-        1
-        for log in pii_logs
-        if any(p.get("risk_level") == "high" for p in log.pii_detected)
+    # Count by PII type
+    pii_type_counts = dict(
+        db.query(
+            _pii_type_count.c.key,
+            func.sum(cast(_pii_type_count.c.value, Integer)),
+        )
+        .select_from(PIIDetectionLog)
+        .join(_pii_type_count, true())
+        .filter(PIIDetectionLog.tenant_id == tenant_id)
+        .group_by(_pii_type_count.c.key)
+        .all()
     )
 
-    # Count by PII type
-    pii_type_counts = {}
-    for log in pii_logs:
-        for pii_item in log.pii_detected:
-            pii_type = pii_item.get("type", "unknown")
-            pii_type_counts[pii_type] = pii_type_counts.get(pii_type, 0) + 1
+    recent = (
+        db.query(*_DETECTION_COLUMNS)
+        .filter(PIIDetectionLog.tenant_id == tenant_id)
+        .order_by(PIIDetectionLog.detection_timestamp.desc())
+        .limit(10)  # Last 10
+        .all()
+    )
 
     return {
         "tenant_id": tenant_id,
         "total_pii_detections": total_detections,
         "high_risk_count": high_risk_count,
         "pii_type_breakdown": pii_type_counts,
-        "recent_detections": [
-            {
-                "detection_id": str(log.id),
-                "audit_log_id": str(log.audit_log_id),
-                "timestamp": log.detection_timestamp,
-                "pii_count": log.pii_count,
-                "high_risk": any(
-                    p.get("risk_level") == "high" for p in log.pii_detected
-                ),
-                "pii_types": list(set(p.get("type") for p in log.pii_detected)),
-            }
-            for log in pii_logs[:10]  # Last 10
-        ],
+        "recent_detections": [_detection_row(log) for log in recent],
     }
 
 
 @app.get("/pii/details/{detection_id}")
 def get_pii_details(detection_id: str, db: Session = Depends(get_db)):
     """Get detailed PII findings for a specific detection."""
-    pii_log = (
-        db.query(PIIDetectionLog).filter(PIIDetectionLog.id == detection_id).first()
+    # The original audit log is loaded in the same query via a JOIN
+    pii_log = db.get(
+        PIIDetectionLog, detection_id, options=[joinedload(PIIDetectionLog.audit_log)]
     )
 
-    # Fetch the original audit log
-    audit_log = None
-    if pii_log:
-        audit_log = (
-            db.query(ConversationAuditLog)
-            .filter(ConversationAuditLog.id == pii_log.audit_log_id)
-            .first()
-        )
-
     if not pii_log:
         return {
             "detection_id": detection_id,
@@ -346,6 +509,7 @@ def get_pii_details(detection_id: str, db: Session = Depends(get_db)):
             "ner_response_response": None,
         }
 
+    audit_log = pii_log.audit_log
     return {
         "detection_id": str(pii_log.id),
         "audit_log_id": str(pii_log.audit_log_id),
@@ -379,69 +543,88 @@ def get_pii_details(detection_id: str, db: Session = Depends(get_db)):
 
 @app.get("/pii/logs")
 def get_pii_logs(
-    tenant_id: str = None, risk_level: str = None, db: Session = Depends(get_db)
+    tenant_id: str = None,
+    risk_level: str = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
 ):
-    """Get PII detection logs with optional filtering."""
+    """
+    Get PII detection logs with optional filtering; count is the filtered total.
+    Pass next_cursor back as cursor for the following page.
+    """
     query = db.query(PIIDetectionLog)
 
     if tenant_id:
         query = query.filter(PIIDetectionLog.tenant_id == tenant_id)
 
-    pii_logs = query.order_by(PIIDetectionLog.detection_timestamp.desc()).all()
-
     # Filter by risk level if specified
     if risk_level:
-        pii_logs = [
-            log
-            for log in pii_logs
-            if any(p.get("risk_level") == risk_level for p in log.pii_detected)
-        ]
+        query = query.filter(_has_risk_level(risk_level))
+
+    count = query.with_entities(func.count(PIIDetectionLog.id)).scalar()
+
+    if cursor:
+        query = query.filter(
+            tuple_(PIIDetectionLog.detection_timestamp, PIIDetectionLog.id)
+            < _decode_cursor(cursor)
+        )
+    pii_logs = (
+        query.with_entities(*_DETECTION_COLUMNS)
+        .order_by(PIIDetectionLog.detection_timestamp.desc(), PIIDetectionLog.id.desc())
+        .limit(limit)
+        .offset(offset)
+        .all()
+    )
+    next_cursor = (
+        _encode_cursor(pii_logs[-1].detection_timestamp, pii_logs[-1].id)
+        if pii_logs and len(pii_logs) == limit
+        else None
+    )
 
     return {
-        "count": len(pii_logs),
-        "logs": [
-            {
-                "detection_id": str(log.id),
-                "audit_log_id": str(log.audit_log_id),
-                "tenant_id": log.tenant_id,
-                "timestamp": log.detection_timestamp,
-                "pii_count": log.pii_count,
-                "high_risk": any(
-                    p.get("risk_level") == "high" for p in log.pii_detected
-                ),
-                "pii_types": list(set(p.get("type") for p in log.pii_detected)),
-            }
-            for log in pii_logs
-        ],
+        "count": count,
+        "logs": [_detection_row(log) for log in pii_logs],
+        "next_cursor": next_cursor,
     }
 
 
 @app.get("/compliance/export")
 def export_compliance_pack(
     tenant_id: str,
-    db: Session = Depends(get_db),
     current_user: CurrentUser = Depends(require_role("admin")),
 ):
     """Generate and download compliance export pack as ZIP."""
     if not tenant_id:
         return {"error": "tenant_id is required"}
 
+    # The export outlives the request-scoped session, so it owns its own
+    db = SessionLocal()
     try:
         print(f"Generating compliance export for tenant: {tenant_id}")
-        zip_buffer = generate_compliance_export(db, tenant_id)
-        zip_data = zip_buffer.getvalue()
-        print(f"Generated ZIP size: {len(zip_data)} bytes")
-
-        return StreamingResponse(
-            iter([zip_data]),
-            media_type="application/zip",
-            headers={
-                "Content-Disposition": f"attachment; filename=compliance_export_{tenant_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.zip"
-            },
-        )
+        chunks = stream_compliance_export(db, tenant_id)
+        # Pull the first chunk eagerly so query errors still surface as JSON
+        first_chunk = next(chunks, b"")
     except Exception as e:
+        db.close()
         print(f"Export error: {str(e)}")
         import traceback
 
         traceback.print_exc()
         return {"error": str(e)}
+
+    def stream():
+        try:
+            yield first_chunk
+            yield from chunks
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename=compliance_export_{tenant_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.zip"
+        },
+    )
@@ -0,0 +1,34 @@
+-- Migration: Add PII Aggregate Columns
+-- Purpose: Store per-detection high-risk and per-type counts at write time so summaries skip the findings JSON
+-- Date: 2026-10-15
+-- Status: Ready to apply
+
+-- Requires pii_detected to be JSONB (see convert_pii_detected_jsonb.sql)
+
+ALTER TABLE pii_detection_logs
+ADD COLUMN IF NOT EXISTS high_risk_count INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS pii_type_counts JSONB NOT NULL DEFAULT '{}'::jsonb;
+
+-- Backfill existing detections from their findings
+UPDATE pii_detection_logs AS p
+SET high_risk_count = agg.high_risk_count,
+    pii_type_counts = agg.pii_type_counts
+FROM (
+    SELECT
+        d.id,
+        (
+            SELECT count(*)
+            FROM jsonb_array_elements(d.pii_detected) AS item
+            WHERE item ->> 'risk_level' = 'high'
+        ) AS high_risk_count,
+        (
+            SELECT coalesce(jsonb_object_agg(t.pii_type, t.n), '{}'::jsonb)
+            FROM (
+                SELECT coalesce(item ->> 'type', 'unknown') AS pii_type, count(*) AS n
+                FROM jsonb_array_elements(d.pii_detected) AS item
+                GROUP BY 1
+            ) AS t
+        ) AS pii_type_counts
+    FROM pii_detection_logs AS d
+) AS agg
+WHERE p.id = agg.id;
@@ -0,0 +1,18 @@
+-- Migration: Add PII Detection -> Audit Log Foreign Key
+-- Purpose: Declare pii_detection_logs.audit_log_id as a foreign key to conversation_audit_logs.id
+-- Date: 2026-10-15
+-- Status: Ready to apply
+
+-- Added NOT VALID first so the ALTER does not scan the table under a heavy
+-- lock; VALIDATE then checks existing rows without blocking writes.
+-- Orphaned detections make VALIDATE fail; find them with:
+--   SELECT p.id FROM pii_detection_logs p
+--   LEFT JOIN conversation_audit_logs c ON c.id = p.audit_log_id
+--   WHERE c.id IS NULL;
+
+ALTER TABLE pii_detection_logs
+ADD CONSTRAINT pii_detection_logs_audit_log_id_fkey
+FOREIGN KEY (audit_log_id) REFERENCES conversation_audit_logs (id) NOT VALID;
+
+ALTER TABLE pii_detection_logs
+VALIDATE CONSTRAINT pii_detection_logs_audit_log_id_fkey;
@@ -0,0 +1,25 @@
+-- Migration: Add Tenant/Timestamp Composite Indexes
+-- Purpose: Let tenant-scoped listings and compliance exports walk the index newest-first instead of sorting
+-- Date: 2026-10-15
+-- Status: Ready to apply
+
+-- Each index matches a "WHERE tenant_id = ? ORDER BY <timestamp> DESC" access path,
+-- so the planner can stream rows in index order without a Sort node.
+-- CONCURRENTLY avoids blocking writes on large tables; it cannot run inside a transaction block.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_conversation_logs_tenant_ts
+ON conversation_audit_logs (tenant_id, timestamp DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pii_detection_logs_tenant_ts
+ON pii_detection_logs (tenant_id, detection_timestamp DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_deletion_audit_logs_tenant_run_ts
+ON deletion_audit_logs (tenant_id, run_timestamp DESC);
+
+-- Lookup of a detection's findings by the audit log they belong to
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pii_detection_logs_audit_log_id
+ON pii_detection_logs (audit_log_id);
+
+-- Verify the plan uses the index (expect "Index Scan using idx_conversation_logs_tenant_ts", no Sort)
+-- EXPLAIN SELECT * FROM conversation_audit_logs
+-- WHERE tenant_id = 'tenant-a' ORDER BY timestamp DESC;
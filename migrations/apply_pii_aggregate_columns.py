@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Migration Helper: Apply PII Aggregate Columns
+Purpose: Add high_risk_count and pii_type_counts to pii_detection_logs and backfill them from pii_detected
+Run this script to programmatically apply the migration.
+"""
+
+import sys
+from sqlalchemy import text
+from database import SessionLocal
+
+
+def apply_migration():
+    """Apply PII aggregate columns migration."""
+    db = SessionLocal()
+    try:
+        print("[INFO] Starting migration: Add PII Aggregate Columns")
+
+        # SQL migration statements
+        migration_sql = """
+        ALTER TABLE pii_detection_logs
+        ADD COLUMN IF NOT EXISTS high_risk_count INTEGER NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS pii_type_counts JSONB NOT NULL DEFAULT '{}'::jsonb;
+        """
+        backfill_sql = """
+        UPDATE pii_detection_logs AS p
+        SET high_risk_count = agg.high_risk_count,
+            pii_type_counts = agg.pii_type_counts
+        FROM (
+            SELECT
+                d.id,
+                (
+                    SELECT count(*)
+                    FROM jsonb_array_elements(d.pii_detected) AS item
+                    WHERE item ->> 'risk_level' = 'high'
+                ) AS high_risk_count,
+                (
+                    SELECT coalesce(jsonb_object_agg(t.pii_type, t.n), '{}'::jsonb)
+                    FROM (
+                        SELECT coalesce(item ->> 'type', 'unknown') AS pii_type, count(*) AS n
+                        FROM jsonb_array_elements(d.pii_detected) AS item
+                        GROUP BY 1
+                    ) AS t
+                ) AS pii_type_counts
+            FROM pii_detection_logs AS d
+        ) AS agg
+        WHERE p.id = agg.id;
+        """
+
+        db.execute(text(migration_sql))
+        result = db.execute(text(backfill_sql))
+        db.commit()
+
+        print("[SUCCESS] Migration applied successfully!")
+        print("[INFO] New columns added:")
+        print("  - high_risk_count (INTEGER)")
+        print("  - pii_type_counts (JSONB)")
+        print(f"[INFO] Backfilled {result.rowcount} existing detections")
+
+        return True
+    except Exception as e:
+        print(f"[ERROR] Migration failed: {str(e)}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    success = apply_migration()
+    sys.exit(0 if success else 1)
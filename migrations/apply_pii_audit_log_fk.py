@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+Migration Helper: Apply PII Detection Audit Log Foreign Key
+Purpose: Declare pii_detection_logs.audit_log_id as a foreign key to conversation_audit_logs.id
+Run this script to programmatically apply the migration.
+"""
+
+import sys
+from sqlalchemy import text
+from database import SessionLocal
+
+
+def apply_migration():
+    """Apply PII detection audit log foreign key migration."""
+    db = SessionLocal()
+    try:
+        print("[INFO] Starting migration: Add PII Detection Audit Log Foreign Key")
+
+        # SQL migration statements
+        add_sql = """
+        ALTER TABLE pii_detection_logs
+        ADD CONSTRAINT pii_detection_logs_audit_log_id_fkey
+        FOREIGN KEY (audit_log_id) REFERENCES conversation_audit_logs (id) NOT VALID;
+        """
+        validate_sql = """
+        ALTER TABLE pii_detection_logs
+        VALIDATE CONSTRAINT pii_detection_logs_audit_log_id_fkey;
+        """
+
+        # Commit the NOT VALID constraint before validating so the heavy lock
+        # is held only briefly
+        db.execute(text(add_sql))
+        db.commit()
+        db.execute(text(validate_sql))
+        db.commit()
+
+        print("[SUCCESS] Migration applied successfully!")
+        print("[INFO] New constraint added:")
+        print("  - pii_detection_logs_audit_log_id_fkey")
+
+        return True
+    except Exception as e:
+        print(f"[ERROR] Migration failed: {str(e)}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    success = apply_migration()
+    sys.exit(0 if success else 1)
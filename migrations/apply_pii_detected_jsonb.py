@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""
+Migration Helper: Convert pii_detected to JSONB
+Purpose: Change pii_detection_logs.pii_detected from JSON to JSONB and add a GIN (jsonb_path_ops) index
+Run this script to programmatically apply the migration.
+"""
+
+import sys
+from sqlalchemy import text
+from database import engine
+
+
+def apply_migration():
+    """Apply pii_detected JSONB conversion migration."""
+    try:
+        print("[INFO] Starting migration: Convert pii_detected to JSONB")
+
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(
+                text(
+                    "ALTER TABLE pii_detection_logs "
+                    "ALTER COLUMN pii_detected TYPE JSONB USING pii_detected::jsonb"
+                )
+            )
+            print("  - pii_detected (JSONB)")
+            conn.execute(
+                text(
+                    "CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+                    "idx_pii_detection_logs_detected_gin "
+                    "ON pii_detection_logs USING GIN (pii_detected jsonb_path_ops)"
+                )
+            )
+            print("  - idx_pii_detection_logs_detected_gin (GIN, jsonb_path_ops)")
+
+        print("[SUCCESS] Migration applied successfully!")
+        return True
+    except Exception as e:
+        print(f"[ERROR] Migration failed: {str(e)}")
+        return False
+
+
+if __name__ == "__main__":
+    success = apply_migration()
+    sys.exit(0 if success else 1)
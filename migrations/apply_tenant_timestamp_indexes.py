@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Migration Helper: Apply Tenant/Timestamp Composite Indexes
+Purpose: Add (tenant_id, timestamp DESC) indexes so exports and listings avoid an ORDER BY sort,
+plus an audit_log_id index for PII detection lookups
+Run this script to programmatically apply the migration.
+"""
+
+import sys
+from sqlalchemy import text
+from database import engine
+
+INDEXES = [
+    (
+        "idx_conversation_logs_tenant_ts",
+        "conversation_audit_logs (tenant_id, timestamp DESC)",
+    ),
+    (
+        "idx_pii_detection_logs_tenant_ts",
+        "pii_detection_logs (tenant_id, detection_timestamp DESC)",
+    ),
+    (
+        "idx_deletion_audit_logs_tenant_run_ts",
+        "deletion_audit_logs (tenant_id, run_timestamp DESC)",
+    ),
+    (
+        "idx_pii_detection_logs_audit_log_id",
+        "pii_detection_logs (audit_log_id)",
+    ),
+]
+
+
+def apply_migration():
+    """Apply tenant/timestamp composite indexes migration."""
+    try:
+        print("[INFO] Starting migration: Add Tenant/Timestamp Composite Indexes")
+
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for name, target in INDEXES:
+                conn.execute(
+                    text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {target}")
+                )
+                print(f"  - {name} ON {target}")
+
+        print("[SUCCESS] Migration applied successfully!")
+        return True
+    except Exception as e:
+        print(f"[ERROR] Migration failed: {str(e)}")
+        return False
+
+
+if __name__ == "__main__":
+    success = apply_migration()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""
+Migration Helper: Apply User Role TEXT Conversion
+Purpose: Convert users.role from a Postgres ENUM to TEXT with a CHECK constraint
+Run this script to programmatically apply the migration.
+"""
+
+import sys
+from sqlalchemy import text
+from database import SessionLocal
+
+
+def apply_migration():
+    """Apply user role TEXT conversion migration."""
+    db = SessionLocal()
+    try:
+        print("[INFO] Starting migration: Convert User Role to TEXT")
+
+        # SQL migration statements
+        migration_sql = """
+        ALTER TABLE users ALTER COLUMN role DROP DEFAULT;
+        ALTER TABLE users ALTER COLUMN role TYPE TEXT USING lower(role::text);
+        ALTER TABLE users ALTER COLUMN role SET DEFAULT 'viewer';
+        ALTER TABLE users
+        ADD CONSTRAINT ck_users_role CHECK (role IN ('admin', 'viewer'));
+        DROP TYPE IF EXISTS role;
+        """
+
+        db.execute(text(migration_sql))
+        db.commit()
+
+        print("[SUCCESS] Migration applied successfully!")
+        print("[INFO] users.role is now TEXT with constraint ck_users_role")
+
+        return True
+    except Exception as e:
+        print(f"[ERROR] Migration failed: {str(e)}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    success = apply_migration()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,20 @@
+-- Migration: Convert pii_detected to JSONB with a GIN index
+-- Purpose: Let risk-level filters and type breakdowns run as indexed JSONB queries in Postgres
+-- Date: 2026-10-15
+-- Status: Ready to apply
+
+-- Rewrites pii_detection_logs and holds an ACCESS EXCLUSIVE lock while it runs;
+-- schedule it in a maintenance window on large tables.
+-- Note: JSONB normalizes object key order, so stored findings are read back
+-- with keys sorted (shorter keys first) rather than in insertion order.
+ALTER TABLE pii_detection_logs
+ALTER COLUMN pii_detected TYPE JSONB USING pii_detected::jsonb;
+
+-- jsonb_path_ops supports @> containment, e.g. pii_detected @> '[{"risk_level": "high"}]'
+-- CONCURRENTLY cannot run inside a transaction block
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pii_detection_logs_detected_gin
+ON pii_detection_logs USING GIN (pii_detected jsonb_path_ops);
+
+-- Verify the column type
+-- SELECT data_type FROM information_schema.columns
+-- WHERE table_name = 'pii_detection_logs' AND column_name = 'pii_detected';
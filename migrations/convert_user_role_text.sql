@@ -0,0 +1,19 @@
+-- Migration: Convert users.role to TEXT
+-- Purpose: Replace the Postgres ENUM type with TEXT plus a CHECK constraint so role reads skip enum coercion
+-- Date: 2026-10-15
+-- Status: Ready to apply
+
+-- The ENUM created by SQLAlchemy stores member names (ADMIN, VIEWER);
+-- the TEXT column stores the lowercase values the API already uses
+
+ALTER TABLE users ALTER COLUMN role DROP DEFAULT;
+
+ALTER TABLE users
+ALTER COLUMN role TYPE TEXT USING lower(role::text);
+
+ALTER TABLE users ALTER COLUMN role SET DEFAULT 'viewer';
+
+ALTER TABLE users
+ADD CONSTRAINT ck_users_role CHECK (role IN ('admin', 'viewer'));
+
+DROP TYPE IF EXISTS role;
@@ -1,11 +1,21 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, Text, TIMESTAMP, Integer, DateTime, JSON, Enum as SQLEnum
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import (
+    Column,
+    Text,
+    TIMESTAMP,
+    Integer,
+    DateTime,
+    JSON,
+    Index,
+    CheckConstraint,
+    ForeignKey,
+)
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from database import Base
 from enum import Enum
 from sqlalchemy import event
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, relationship
 
 
 class Role(str, Enum):
@@ -40,6 +50,11 @@ class ConversationAuditLog(Base):
         JSON, nullable=True
     )  # Extra config: top_p, frequency_penalty, etc.
 
+    # Tenant-scoped listings and exports read newest-first
+    __table_args__ = (
+        Index("idx_conversation_logs_tenant_ts", tenant_id, timestamp.desc()),
+    )
+
 
 # Enforce append-only & immutable: prevent any UPDATE or DELETE operations on ConversationAuditLog instances.
 @event.listens_for(ConversationAuditLog, "before_update", propagate=True)
@@ -79,6 +94,10 @@ class DeletionAuditLog(Base):
     deleted_count = Column(Integer, nullable=False)
     run_timestamp = Column(DateTime(timezone=True), default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("idx_deletion_audit_logs_tenant_run_ts", tenant_id, run_timestamp.desc()),
+    )
+
 
 class PIIDetectionLog(Base):
     """Records PII detection results for audit logs.
@@ -89,13 +108,18 @@ class PIIDetectionLog(Base):
     __tablename__ = "pii_detection_logs"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    audit_log_id = Column(UUID(as_uuid=True), nullable=False)
+    audit_log_id = Column(
+        UUID(as_uuid=True), ForeignKey("conversation_audit_logs.id"), nullable=False
+    )
     tenant_id = Column(Text, nullable=False)
     detection_timestamp = Column(TIMESTAMP(timezone=True), default=datetime.utcnow)
     pii_detected = Column(
-        JSON, nullable=False
+        JSONB, nullable=False
     )  # list of {type, value, field, risk_level}
     pii_count = Column(Integer, nullable=False, default=0)
+    # Aggregates of pii_detected computed at write time for summaries/listings
+    high_risk_count = Column(Integer, nullable=False, default=0)
+    pii_type_counts = Column(JSONB, nullable=False, default=dict)  # {type: count}
     fields_scanned = Column(JSON, nullable=False)  # ["prompt", "response"]
     ner_response_prompt = Column(JSON, nullable=True)  # NER API response for prompt
     ner_response_response = Column(JSON, nullable=True)  # NER API response for response
@@ -107,6 +131,24 @@ class PIIDetectionLog(Base):
         Text, nullable=False, default="dslim/bert-base-NER"
     )  # NER model used
 
+    # Not loaded by default; /pii/details eager-loads it with joinedload
+    audit_log = relationship("ConversationAuditLog")
+
+    __table_args__ = (
+        Index(
+            "idx_pii_detection_logs_tenant_ts", tenant_id, detection_timestamp.desc()
+        ),
+        # Looked up from /pii/details and joins back to the audit log
+        Index("idx_pii_detection_logs_audit_log_id", audit_log_id),
+        # Serves containment filters such as pii_detected @> '[{"risk_level": "high"}]'
+        Index(
+            "idx_pii_detection_logs_detected_gin",
+            pii_detected,
+            postgresql_using="gin",
+            postgresql_ops={"pii_detected": "jsonb_path_ops"},
+        ),
+    )
+
 
 class User(Base):
     """User model with role-based access control."""
@@ -115,5 +157,9 @@ class User(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     username = Column(Text, unique=True, nullable=False)
-    role = Column(SQLEnum(Role), nullable=False, default=Role.VIEWER)
+    role = Column(Text, nullable=False, default=Role.VIEWER.value)
     created_at = Column(TIMESTAMP(timezone=True), default=datetime.utcnow)
+
+    __table_args__ = (
+        CheckConstraint("role IN ('admin', 'viewer')", name="ck_users_role"),
+    )
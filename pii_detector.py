@@ -1,4 +1,3 @@
-
 """
 PII Detection module using HuggingFace Router Inference API.
 Model: dslim/bert-base-NER
@@ -7,8 +6,24 @@ Requires HF_TOKEN environment variable.
 
 import os
 import re
+import hashlib
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+import orjson
 import requests
-from typing import List, Dict, Any
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import OrderedDict
+from itertools import chain
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    TimeoutError as FutureTimeoutError,
+)
+from typing import List, Dict, Any, Iterable, Optional
 
 
 from dotenv import load_dotenv
@@ -16,6 +31,8 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger("pii_detector")
+
 
 # ==============================
 # HuggingFace API Configuration
@@ -31,7 +48,37 @@ HEADERS = {
     "Content-Type": "application/json",
 }
 
-if not HF_API_TOKEN:
+# NER batches that may be waiting on the API at once (one batcher worker each)
+NER_MAX_IN_FLIGHT = int(os.getenv("NER_MAX_IN_FLIGHT", "4"))
+
+# Long-lived session so TLS connections to the router are reused across calls
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=NER_MAX_IN_FLIGHT,
+        max_retries=Retry(
+            total=2,
+            # A read timeout already cost NER_TIMEOUT_SECONDS; don't retry it.
+            # False (not 0) re-raises it as requests' Timeout, not MaxRetryError
+            read=False,
+            backoff_factor=0.2,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=None,  # NER inference POSTs are safe to retry
+        ),
+    ),
+)
+# Auth and content-type headers are sent with every request on the session
+_SESSION.headers.update(HEADERS)
+
+# Path or hub id of an ONNX export of dslim/bert-base-NER (ideally int8
+# quantized). When set and optimum/onnxruntime are installed, NER runs
+# in-process instead of calling the router; the HTTP API stays the fallback.
+NER_LOCAL_MODEL = os.getenv("NER_LOCAL_MODEL")
+NER_LOCAL_BATCH_SIZE = int(os.getenv("NER_LOCAL_BATCH_SIZE", "8"))
+
+if not HF_API_TOKEN and not NER_LOCAL_MODEL:
     print("⚠️  Warning: HF_TOKEN environment variable not set.")
     print("   PII detection via NER will be disabled.")
 
@@ -47,12 +94,19 @@ PII_RISK_LEVELS = {
 }
 
 
+# Sort rank of each risk level, most severe first
+_RISK_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+
+# PII type -> risk level, inverted once from PII_RISK_LEVELS
+_TYPE_TO_RISK = {
+    pii_type: level for level, types in PII_RISK_LEVELS.items() for pii_type in types
+}
+
+
 def get_risk_level(pii_type: str) -> str:
     """Map PII type to risk level."""
-    for level, types in PII_RISK_LEVELS.items():
-        if pii_type in types:
-            return level
-    return "low"
+    return _TYPE_TO_RISK.get(pii_type, "low")
 
 
 # ==============================
@@ -60,60 +114,391 @@ def get_risk_level(pii_type: str) -> str:
 # ==============================
 
 
-def query_hf_ner(text: str) -> tuple:
+# Concurrent NER calls are coalesced into one request with a list of inputs
+NER_MAX_BATCH = int(os.getenv("NER_MAX_BATCH", "32"))
+NER_MAX_WAIT_SECONDS = float(os.getenv("NER_MAX_WAIT_MS", "20")) / 1000
+
+
+# Short prompts come back well within this; a slow backend should not pin
+# the batcher thread for long
+NER_TIMEOUT_SECONDS = float(os.getenv("NER_TIMEOUT_SECONDS", "3"))
+
+# How long a scan waits for its NER result (queueing included) before it
+# settles for regex-only findings
+NER_RESULT_TIMEOUT_SECONDS = float(os.getenv("NER_RESULT_TIMEOUT_SECONDS", "10"))
+
+# Circuit breaker: after NER_BREAKER_FAILURES consecutive failures (timeouts,
+# connection errors, 5xx, 429 and auth errors) the HF API is skipped for
+# NER_BREAKER_COOLDOWN_SECONDS and scans return regex-only findings. The first
+# call after the cooldown is a trial: success closes the breaker, another
+# failure reopens it.
+NER_BREAKER_FAILURES = int(os.getenv("NER_BREAKER_FAILURES", "5"))
+NER_BREAKER_COOLDOWN_SECONDS = float(os.getenv("NER_BREAKER_COOLDOWN_SECONDS", "30"))
+# 4xx statuses that fail every request until something changes upstream
+_HF_OUTAGE_STATUSES = {401, 403, 429}
+_hf_state = {"failures": 0, "opened_at": 0.0}
+_hf_state_lock = threading.Lock()
+
+
+def _hf_breaker_open() -> bool:
+    with _hf_state_lock:
+        return (
+            _hf_state["failures"] >= NER_BREAKER_FAILURES
+            and time.monotonic() - _hf_state["opened_at"] < NER_BREAKER_COOLDOWN_SECONDS
+        )
+
+
+def _record_hf_result(ok: bool):
+    with _hf_state_lock:
+        if ok:
+            _hf_state["failures"] = 0
+            return
+        _hf_state["failures"] += 1
+        if _hf_state["failures"] >= NER_BREAKER_FAILURES:
+            _hf_state["opened_at"] = time.monotonic()
+            logger.warning(
+                "HF API failed %d times in a row; skipping NER for %ss",
+                _hf_state["failures"],
+                NER_BREAKER_COOLDOWN_SECONDS,
+            )
+
+
+def _post_ner_batch(texts: List[str]) -> list:
     """
-    Call HuggingFace Router Inference API for Named Entity Recognition.
-    Returns (findings, raw_response) tuple
+    Send several texts to the NER endpoint in one POST.
+    Returns one raw entity list per text (None for a text on failure or
+    while the circuit breaker is open).
     """
-    if not HF_API_TOKEN or not text or len(text) < 5:
-        return [], None
-
-    payload = {"inputs": text[:512]}  # Hard limit for inference safety
+    if _hf_breaker_open():
+        return [None] * len(texts)
 
     try:
-        response = requests.post(
+        # Content-Type is already a session header, so orjson's bytes go as-is
+        response = _SESSION.post(
             HF_API_URL,
-            headers=HEADERS,
-            json=payload,
-            timeout=10,
+            data=orjson.dumps({"inputs": texts}),
+            timeout=NER_TIMEOUT_SECONDS,
         )
 
-        print("\n\nResponse from llm: ", response)
+        logger.debug("Response from llm (%d inputs): %s", len(texts), response)
 
         if response.status_code != 200:
-            print(f"HF API Error {response.status_code}: {response.text}")
-            return [], None
+            logger.warning("HF API Error %s: %s", response.status_code, response.text)
+            if (
+                response.status_code in _HF_OUTAGE_STATUSES
+                or response.status_code >= 500
+            ):
+                _record_hf_result(False)
+            # Any other 4xx is about this request: it neither counts nor resets
+            return [None] * len(texts)
+
+        entities = orjson.loads(response.content)
+        _record_hf_result(True)
+
+        logger.debug("Entities from llm: %s", entities)
+
+        if len(texts) == 1:
+            if not isinstance(entities, list):
+                # Error or "model loading" body: a failure, not a cacheable result
+                logger.warning("Unexpected NER response: %s", entities)
+                return [None]
+            # A single input may come back as a flat entity list
+            if not entities or isinstance(entities[0], dict):
+                return [entities]
+            return entities
+        if not isinstance(entities, list) or len(entities) != len(texts):
+            # The batch was not answered per input; ask for each text on its own
+            logger.warning("Unexpected batched NER response, retrying per text")
+            return [_post_ner_batch([text])[0] for text in texts]
+        return entities
 
-        entities = response.json()
+    except requests.exceptions.Timeout:
+        logger.warning("HF API timeout")
+        _record_hf_result(False)
+        return [None] * len(texts)
+    except Exception as e:
+        logger.warning("NER API error: %s", e)
+        _record_hf_result(False)
+        return [None] * len(texts)
+
+
+_local_ner_pipeline = None
+_local_ner_failed = False
+_local_ner_lock = threading.Lock()
+# Batcher workers share one pipeline; run it for one batch at a time
+_local_ner_run_lock = threading.Lock()
+
+
+def _get_local_ner():
+    """Load the local ONNX NER pipeline once; None if not configured or unavailable."""
+    global _local_ner_pipeline, _local_ner_failed
+    if not NER_LOCAL_MODEL or _local_ner_pipeline is not None or _local_ner_failed:
+        return _local_ner_pipeline
+    with _local_ner_lock:
+        if _local_ner_pipeline is None and not _local_ner_failed:
+            try:
+                from optimum.onnxruntime import ORTModelForTokenClassification
+                from transformers import AutoTokenizer, pipeline
+
+                model = ORTModelForTokenClassification.from_pretrained(NER_LOCAL_MODEL)
+                tokenizer = AutoTokenizer.from_pretrained(NER_LOCAL_MODEL)
+                _local_ner_pipeline = pipeline(
+                    "token-classification",
+                    model=model,
+                    tokenizer=tokenizer,
+                    aggregation_strategy="simple",
+                )
+                logger.info("Loaded local NER model from %s", NER_LOCAL_MODEL)
+            except Exception as e:
+                logger.warning("Local NER model unavailable, using the HF API: %s", e)
+                _local_ner_failed = True
+    return _local_ner_pipeline
 
-        print("\n\nEntities from llm: ", entities)
 
-        if not isinstance(entities, list):
-            return [], entities  # Return raw response even if not a list
+def local_ner(texts: List[str]) -> List[List[dict]]:
+    """
+    Run NER in-process with the local ONNX model.
+    Returns one entity list per text, shaped like the HF API response.
+    """
+    with _local_ner_run_lock:
+        outputs = _get_local_ner()(texts, batch_size=NER_LOCAL_BATCH_SIZE)
+    # Scores come back as numpy floats, which the JSON columns cannot store
+    return [
+        [{**entity, "score": float(entity["score"])} for entity in output]
+        for output in outputs
+    ]
+
+
+def _run_ner_batch(texts: List[str]) -> list:
+    """NER for a batch of texts: the local model when loaded, else the HF API."""
+    if _get_local_ner() is not None:
+        try:
+            return local_ner(texts)
+        except Exception as e:
+            logger.warning("Local NER failed, using the HF API: %s", e)
+    return _post_ner_batch(texts)
+
+
+class NerBatcher:
+    """
+    Opportunistic batcher for NER calls.
+    Callers block in submit(); a worker thread takes the first waiting text,
+    collects whatever else arrives within max_wait (up to max_batch), and
+    answers the whole batch with one HTTP request (or one local model call).
+    With several workers, one collects the next batch while the others wait
+    on their requests, so a slow batch does not hold up the rest.
+    """
 
-        findings = []
+    def __init__(self, max_batch: int, max_wait: float, workers: int = 1):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.workers = workers
+        self._queue = queue.Queue()
+        self._started = False
+        self._lock = threading.Lock()
+        # Only one worker gathers at a time, so concurrent texts still share
+        # a batch instead of being spread over idle workers
+        self._collect_lock = threading.Lock()
+
+    def submit(self, text: str):
+        """Return the raw NER response for text (None on failure)."""
+        return self.submit_many([text])[0]
+
+    def submit_many(self, texts: List[str]) -> list:
+        """
+        Return one raw NER response per text.
+        All texts are queued before waiting, so they share a request.
+        """
+        return [future.result() for future in self.enqueue(texts)]
+
+    def enqueue(self, texts: List[str]) -> List[Future]:
+        """Queue texts without waiting; each Future resolves to a raw response."""
+        self._ensure_workers()
+        futures = []
+        for text in texts:
+            future = Future()
+            self._queue.put((text, future))
+            futures.append(future)
+        return futures
+
+    def _ensure_workers(self):
+        if self._started:
+            return
+        with self._lock:
+            if not self._started:
+                for i in range(self.workers):
+                    threading.Thread(
+                        target=self._run, daemon=True, name=f"ner-batcher-{i}"
+                    ).start()
+                self._started = True
+
+    def _run(self):
+        while True:
+            with self._collect_lock:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.max_wait
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+
+            results = _run_ner_batch([text for text, _ in batch])
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            # Never leave a caller waiting if the response was short
+            for _, future in batch[len(results) :]:
+                future.set_result(None)
+
+
+_ner_batcher = NerBatcher(NER_MAX_BATCH, NER_MAX_WAIT_SECONDS, NER_MAX_IN_FLIGHT)
+
+
+def _ner_findings(entities: list) -> List[Dict[str, Any]]:
+    """Turn a raw NER entity list into findings."""
+    findings = []
 
-        for entity in entities:
-            entity_type = entity.get("entity_group", "").upper()
+    for entity in entities:
+        entity_type = entity.get("entity_group", "").upper()
 
-            if entity_type in ["PERSON", "ORG", "LOC", "MISC", "DATE"]:
-                findings.append(
-                    {
-                        "type": entity_type,
-                        "value": entity.get("word", ""),
-                        "score": entity.get("score", 0.0),
-                        "risk_level": get_risk_level(entity_type),
-                    }
-                )
+        if entity_type in ["PERSON", "ORG", "LOC", "MISC", "DATE"]:
+            findings.append(
+                {
+                    "type": entity_type,
+                    "value": entity.get("word", ""),
+                    "score": entity.get("score", 0.0),
+                    "risk_level": get_risk_level(entity_type),
+                }
+            )
 
-        return findings, entities
+    return findings
 
-    except requests.exceptions.Timeout:
-        print("HF API timeout")
-        return [], None
-    except Exception as e:
-        print(f"NER API error: {e}")
-        return [], None
+
+# Raw NER responses for recently seen texts (repeated system prompts, canned
+# replies), keyed by a digest of the truncated text. 0 disables the cache.
+NER_CACHE_SIZE = int(os.getenv("NER_CACHE_SIZE", "1024"))
+_ner_cache = OrderedDict()
+_ner_cache_lock = threading.Lock()
+
+
+def _ner_cache_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+def _ner_cache_get(key: bytes):
+    with _ner_cache_lock:
+        entities = _ner_cache.get(key)
+        if entities is not None:
+            _ner_cache.move_to_end(key)
+    return entities
+
+
+def _ner_cache_put(key: bytes, entities: list):
+    if NER_CACHE_SIZE <= 0:
+        return
+    with _ner_cache_lock:
+        _ner_cache[key] = entities
+        _ner_cache.move_to_end(key)
+        if len(_ner_cache) > NER_CACHE_SIZE:
+            _ner_cache.popitem(last=False)
+
+
+def clear_ner_cache():
+    """Drop all cached NER responses."""
+    with _ner_cache_lock:
+        _ner_cache.clear()
+
+
+# Hard limit for inference safety; keeps inputs well under the model's 512 tokens
+NER_MAX_CHARS = 512
+
+
+def _truncate_for_ner(text: str) -> str:
+    """Cut text to NER_MAX_CHARS, backing off to a word boundary."""
+    if len(text) <= NER_MAX_CHARS:
+        return text
+    head = text[:NER_MAX_CHARS]
+    if text[NER_MAX_CHARS].isspace():
+        return head
+    # A word split in half would come back as a bogus entity fragment
+    words = head.rsplit(None, 1)
+    return words[0] if len(words) == 2 else head
+
+
+def _queue_ner(texts: List[str]) -> list:
+    """
+    Queue texts for NER without waiting.
+    Returns a (cache_key, Future) pair per text, or None for texts that are not
+    sent. Cached texts get an already resolved Future.
+    """
+    if not HF_API_TOKEN and not NER_LOCAL_MODEL:
+        return [None] * len(texts)
+
+    pending = []
+    to_send = []
+    for text in texts:
+        if not text or len(text) < 5:
+            pending.append(None)
+            continue
+        text = _truncate_for_ner(text)
+        key = _ner_cache_key(text)
+        entities = _ner_cache_get(key)
+        if entities is None:
+            to_send.append((len(pending), key, text))
+            pending.append(None)
+        else:
+            future = Future()
+            future.set_result(entities)
+            pending.append((key, future))
+
+    futures = _ner_batcher.enqueue([text for _, _, text in to_send])
+    for (i, key, _), future in zip(to_send, futures):
+        pending[i] = (key, future)
+    return pending
+
+
+def _collect_ner(pending: list) -> List[tuple]:
+    """Wait for queued NER calls; returns one (findings, raw_response) per text."""
+    results = []
+    # One deadline for the whole set, not a fresh timeout per text
+    deadline = time.monotonic() + NER_RESULT_TIMEOUT_SECONDS
+    for item in pending:
+        if item is None:
+            results.append(([], None))
+            continue
+        key, future = item
+        try:
+            entities = future.result(timeout=max(0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            logger.warning("NER result not ready in %ss", NER_RESULT_TIMEOUT_SECONDS)
+            entities = None
+        if not isinstance(entities, list):
+            results.append(([], None))
+        else:
+            _ner_cache_put(key, entities)
+            # Findings are built fresh per call, so callers may mutate them
+            results.append((_ner_findings(entities), entities))
+    return results
+
+
+def query_hf_ner_batch(texts: List[str]) -> List[tuple]:
+    """
+    Call HuggingFace Router Inference API for Named Entity Recognition on
+    several texts with a single request.
+    Returns one (findings, raw_response) tuple per text
+    """
+    return _collect_ner(_queue_ner(texts))
+
+
+def query_hf_ner(text: str) -> tuple:
+    """
+    Call HuggingFace Router Inference API for Named Entity Recognition.
+    Returns (findings, raw_response) tuple
+    """
+    return query_hf_ner_batch([text])[0]
 
 
 # ==============================
@@ -128,20 +513,38 @@ PATTERNS = {
     "ipv4": r"\b(?:(?:25[0-5]|2[0-4]\d|[01]?\d\d?)\.){3}(?:25[0-5]|2[0-4]\d|[01]?\d\d?)\b",
 }
 
+# Compiled once at import instead of going through re's cache on every call.
+# Every pattern targets ASCII-only formats, so re.ASCII keeps \d, \s and \b
+# off the Unicode character tables.
+# Emails get their own pass. The digit-based patterns share one alternation,
+# tried most specific first, behind a lookahead that skips every position
+# where none of them can start.
+_DIGIT_PII_TYPES = ["ssn", "credit_card", "ipv4", "phone"]
+_COMPILED_PATTERNS = [
+    re.compile(f"(?P<email>{PATTERNS['email']})", re.ASCII),
+    re.compile(
+        r"(?=[+(\d])(?:"
+        + "|".join(f"(?P<{name}>{PATTERNS[name]})" for name in _DIGIT_PII_TYPES)
+        + ")",
+        re.ASCII,
+    ),
+]
+
 
 def detect_pii_regex(text: str) -> List[Dict[str, Any]]:
     """Detect PII using regex rules."""
     findings = []
 
-    for pattern_name, pattern in PATTERNS.items():
-        for match in re.finditer(pattern, text):
+    for pattern in _COMPILED_PATTERNS:
+        for match in pattern.finditer(text):
+            pattern_name = match.lastgroup
             findings.append(
                 {
                     "type": pattern_name,
                     "value": match.group(0),
                     "start": match.start(),
                     "end": match.end(),
-                    "risk_level": get_risk_level(pattern_name),
+                    "risk_level": _TYPE_TO_RISK[pattern_name],
                 }
             )
 
@@ -153,68 +556,175 @@ def detect_pii_regex(text: str) -> List[Dict[str, Any]]:
 # ==============================
 
 
-def inspect_text_for_pii(text: str) -> tuple:
-    """
-    Detect PII using both regex and NER.
-    Returns (findings, ner_response) tuple
-    """
-    if not text or len(text) < 3:
-        return [], None
+# Optional process pool for the regex scan (0 = scan in the calling thread)
+PII_REGEX_WORKERS = int(os.getenv("PII_REGEX_WORKERS", "0"))
+# Shorter texts are cheaper to scan inline than to ship to another process
+PII_REGEX_POOL_MIN_CHARS = int(os.getenv("PII_REGEX_POOL_MIN_CHARS", "2000"))
+
+_regex_pool = None
+_regex_pool_lock = threading.Lock()
 
-    findings = []
 
-    findings.extend(detect_pii_regex(text))
-    ner_findings, ner_response = query_hf_ner(text)
-    findings.extend(ner_findings)
+def _get_regex_pool():
+    global _regex_pool
+    if _regex_pool is None:
+        with _regex_pool_lock:
+            if _regex_pool is None:
+                # spawn: forking a process that already runs threads is unsafe
+                _regex_pool = ProcessPoolExecutor(
+                    max_workers=PII_REGEX_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _regex_pool
+
 
-    # Deduplicate findings
+def _dedupe_and_sort(
+    findings: Iterable[Dict[str, Any]], field: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Drop repeated (type, value) findings and order by risk level.
+    Kept findings are tagged with field when one is given.
+    """
     unique = {}
     for item in findings:
         key = (item["type"], item["value"].lower())
         if key not in unique:
             unique[key] = item
+            if field is not None:
+                item["field"] = field
+    deduped = list(unique.values())
 
-    # Sort by risk level
-    sorted_findings = sorted(
-        unique.values(),
-        key=lambda x: {"high": 0, "medium": 1, "low": 2}.get(
-            x.get("risk_level", "low"), 3
-        ),
-    )
+    # Sort by risk level; nothing to reorder if all share one level
+    if len({item.get("risk_level", "low") for item in deduped}) <= 1:
+        return deduped
 
-    return sorted_findings, ner_response
+    return sorted(deduped, key=lambda x: _RISK_ORDER.get(x.get("risk_level", "low"), 3))
 
 
-# ==============================
-# Audit Log Scanner
-# ==============================
+# NER only tags words, so texts without a single letter skip it
+_HAS_LETTER = re.compile(r"[^\W\d_]")
 
 
-def scan_audit_log_for_pii(prompt: str, response: str) -> Dict[str, Any]:
+def _start_regex(text: str):
+    """Regex findings for text, or a Future for them when the pool is used."""
+    if PII_REGEX_WORKERS > 0 and len(text) >= PII_REGEX_POOL_MIN_CHARS:
+        # Regex runs on another core, off the GIL
+        return _get_regex_pool().submit(detect_pii_regex, text)
+    return detect_pii_regex(text)
+
+
+def _regex_findings(result) -> List[Dict[str, Any]]:
+    if isinstance(result, Future):
+        return result.result()
+    return result
+
+
+def inspect_texts_for_pii(
+    texts: List[str],
+    skip_ner_if_high: bool = False,
+    fields: Optional[List[str]] = None,
+) -> List[tuple]:
     """
-    Scan prompt and response text for PII.
+    Detect PII in several texts using both regex and NER.
+    NER for all texts goes out in one request.
+    With skip_ner_if_high, texts where regex already found high-risk PII are
+    not sent to NER; use it only when the high-risk verdict is all that matters.
+    fields, if given, holds one name per text to store on its findings as "field".
+    Returns one (findings, ner_response) tuple per text
+    """
+    scanned = [bool(text) and len(text) >= 3 for text in texts]
+    ner_texts = [
+        text if scan and _HAS_LETTER.search(text) else ""
+        for text, scan in zip(texts, scanned)
+    ]
+
+    if skip_ner_if_high:
+        # NER depends on the regex verdict, so the two cannot overlap
+        regex_results = [
+            _regex_findings(_start_regex(text)) if scan else []
+            for text, scan in zip(texts, scanned)
+        ]
+        ner_texts = [
+            "" if any(item["risk_level"] == "high" for item in findings) else text
+            for text, findings in zip(ner_texts, regex_results)
+        ]
+        pending_ner = _queue_ner(ner_texts)
+    else:
+        # NER goes out first so the regex scans below overlap the HTTP round trip
+        pending_ner = _queue_ner(ner_texts)
+        regex_results = [
+            _start_regex(text) if scan else [] for text, scan in zip(texts, scanned)
+        ]
+
+    ner_results = _collect_ner(pending_ner)
+
+    if fields is None:
+        fields = [None] * len(texts)
+
+    results = []
+    for scan, field, regex_findings, (ner_findings, ner_response) in zip(
+        scanned, fields, regex_results, ner_results
+    ):
+        if not scan:
+            results.append(([], None))
+            continue
+        # One dedup pass over both sources, no concatenated list in between
+        findings = chain(_regex_findings(regex_findings), ner_findings)
+        results.append((_dedupe_and_sort(findings, field), ner_response))
+
+    return results
+
+
+def inspect_text_for_pii(
+    text: str, skip_ner_if_high: bool = False, field: Optional[str] = None
+) -> tuple:
     """
-    prompt_pii, prompt_ner_response = inspect_text_for_pii(prompt)
-    response_pii, response_ner_response = inspect_text_for_pii(response)
+    Detect PII using both regex and NER.
+    Returns (findings, ner_response) tuple
+    """
+    return inspect_texts_for_pii([text], skip_ner_if_high, [field])[0]
 
-    all_pii = []
 
-    for item in prompt_pii:
-        item["field"] = "prompt"
-        all_pii.append(item)
+# ==============================
+# Audit Log Scanner
+# ==============================
+
 
-    for item in response_pii:
-        item["field"] = "response"
-        all_pii.append(item)
+def _scan_result(prompt_result: tuple, response_result: tuple) -> Dict[str, Any]:
+    """Combine the prompt and response inspections of one audit log."""
+    prompt_pii, prompt_ner_response = prompt_result
+    response_pii, response_ner_response = response_result
 
-    high_risk = [p for p in all_pii if p["risk_level"] == "high"]
+    # Findings arrive already tagged with their field
+    all_pii = prompt_pii + response_pii
+    high_risk_count = sum(1 for p in all_pii if p["risk_level"] == "high")
 
     return {
         "total_pii_found": len(all_pii),
-        "high_risk_count": len(high_risk),
-        "has_high_risk": len(high_risk) > 0,
+        "high_risk_count": high_risk_count,
+        "has_high_risk": high_risk_count > 0,
         "fields_scanned": ["prompt", "response"],
         "pii_list": all_pii,
         "ner_response_prompt": prompt_ner_response,
         "ner_response_response": response_ner_response,
     }
+
+
+def scan_audit_logs_for_pii(logs: List[tuple]) -> List[Dict[str, Any]]:
+    """
+    Scan several (prompt, response) pairs for PII.
+    Every text is queued for NER at once, so the whole set goes out in as few
+    requests as the batcher allows instead of one round trip per log.
+    """
+    results = inspect_texts_for_pii(
+        [text for pair in logs for text in pair],
+        fields=["prompt", "response"] * len(logs),
+    )
+    return [_scan_result(results[i], results[i + 1]) for i in range(0, len(results), 2)]
+
+
+def scan_audit_log_for_pii(prompt: str, response: str) -> Dict[str, Any]:
+    """
+    Scan prompt and response text for PII.
+    """
+    return scan_audit_logs_for_pii([(prompt, response)])[0]
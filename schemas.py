@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 from uuid import UUID
 
@@ -14,13 +15,17 @@ class AuditLogCreate(BaseModel):
         "default"  # Model name/version used (e.g., 'gpt-4', 'claude-3', etc.)
     )
     # Model metadata for auditor traceability
-    model_provider: str = None  # e.g., 'openai', 'anthropic', 'cohere'
-    model_name: str = None  # e.g., 'gpt-4', 'claude-3-sonnet'
-    model_version: str = None  # e.g., '1.0', 'v20240115'
-    deployment_id: str = None  # e.g., Azure deployment ID
-    temperature: str = None  # e.g., '0.7' (as string for precision)
-    safety_mode: str = None  # e.g., 'strict', 'relaxed', 'balanced'
-    model_config: dict = None  # Extra config: top_p, frequency_penalty, etc.
+    model_provider: Optional[str] = None  # e.g., 'openai', 'anthropic', 'cohere'
+    model_name: Optional[str] = None  # e.g., 'gpt-4', 'claude-3-sonnet'
+    model_version: Optional[str] = None  # e.g., '1.0', 'v20240115'
+    deployment_id: Optional[str] = None  # e.g., Azure deployment ID
+    temperature: Optional[str] = None  # e.g., '0.7' (as string for precision)
+    safety_mode: Optional[str] = None  # e.g., 'strict', 'relaxed', 'balanced'
+    # Extra config: top_p, frequency_penalty, etc. Sent and stored as
+    # "model_config", which is a reserved attribute name on pydantic v2 models
+    provider_config: Optional[dict] = Field(default=None, alias="model_config")
+
+    model_config = ConfigDict(populate_by_name=True, protected_namespaces=())
 
 
 class AuditLogResponse(BaseModel):
@@ -41,8 +46,7 @@ class DeletionAuditRecord(BaseModel):
     deleted_count: int
     run_timestamp: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ============ AUTH & RBAC SCHEMAS ============
@@ -59,8 +63,7 @@ class UserResponse(BaseModel):
     role: str
     created_at: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class CurrentUser(BaseModel):
@@ -0,0 +1,163 @@
+"""
+Unit Tests: AuditWriter
+Tests for coalescing single audit log writes into bulk inserts, and for
+write failures that must not hang callers
+"""
+
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from types import SimpleNamespace
+
+import pytest
+
+import crud
+from crud import AuditWriter
+
+
+class FakeSession:
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class BrokenSession:
+    """Session whose rollback fails, as it does on a dropped connection."""
+
+    def rollback(self):
+        raise RuntimeError("connection lost during rollback")
+
+    def close(self):
+        pass
+
+
+class FakeBulkInsert:
+    """Records each create_logs_bulk call; logs marked "bad" fail the insert."""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, db, items):
+        with self._lock:
+            self.calls.append([item["prompt"] for item in items])
+        if any(item.get("bad") for item in items):
+            raise ValueError("bad log in batch")
+        return [SimpleNamespace(id=item["prompt"], timestamp="now") for item in items]
+
+
+@pytest.fixture
+def bulk_insert(monkeypatch):
+    fake = FakeBulkInsert()
+    monkeypatch.setattr(crud, "SessionLocal", FakeSession)
+    monkeypatch.setattr(crud, "create_logs_bulk", fake)
+    return fake
+
+
+def _submit_concurrently(writer, logs):
+    barrier = threading.Barrier(len(logs))
+    results = {}
+
+    def call(data):
+        barrier.wait()
+        try:
+            results[data["prompt"]] = writer.submit(data)
+        except Exception as e:
+            results[data["prompt"]] = e
+
+    threads = [threading.Thread(target=call, args=(data,)) for data in logs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_concurrent_submits_share_one_insert(bulk_insert):
+    """Logs submitted together are written with a single bulk insert."""
+    print("[TEST] Submitting audit logs from several threads at once...")
+
+    writer = AuditWriter(max_batch=50, max_wait=0.2, timeout=5)
+    results = _submit_concurrently(writer, [{"prompt": f"log-{i}"} for i in range(8)])
+
+    assert len(bulk_insert.calls) < 8
+    assert all(results[f"log-{i}"].id == f"log-{i}" for i in range(8))
+
+    print(f"[PASS] 8 logs written in {len(bulk_insert.calls)} insert(s)")
+
+
+def test_bad_log_only_fails_its_own_caller(bulk_insert):
+    """A failing batch is retried log by log so the good logs still land."""
+    print("[TEST] Submitting a batch that contains one bad log...")
+
+    writer = AuditWriter(max_batch=50, max_wait=0.2, timeout=5)
+    logs = [{"prompt": f"log-{i}"} for i in range(4)]
+    logs.append({"prompt": "log-bad", "bad": True})
+    results = _submit_concurrently(writer, logs)
+
+    assert isinstance(results["log-bad"], ValueError)
+    assert all(results[f"log-{i}"].id == f"log-{i}" for i in range(4))
+
+    print("[PASS] Only the bad log's caller saw the error")
+
+
+def test_worker_survives_write_errors(monkeypatch):
+    """An error escaping _write fails the callers and keeps the worker running."""
+    print("[TEST] Submitting logs while the database connection is broken...")
+
+    def failing_bulk(db, items):
+        raise RuntimeError("insert failed")
+
+    monkeypatch.setattr(crud, "SessionLocal", BrokenSession)
+    monkeypatch.setattr(crud, "create_logs_bulk", failing_bulk)
+    writer = AuditWriter(max_batch=10, max_wait=0.01, timeout=5)
+
+    with pytest.raises(RuntimeError, match="rollback"):
+        writer.submit({"prompt": "first"})
+
+    row = SimpleNamespace(id="log-1", timestamp="now")
+    monkeypatch.setattr(
+        crud, "create_logs_bulk", lambda db, items: [row for _ in items]
+    )
+    assert writer.submit({"prompt": "second"}) is row
+    assert writer._worker.is_alive()
+
+    print("[PASS] Worker recovered after a failed batch")
+
+
+def test_timed_out_log_is_never_written(bulk_insert, monkeypatch):
+    """A log stuck behind a slow write times out and is dropped, not inserted later."""
+    print("[TEST] Submitting a log while the writer is stuck on another batch...")
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def stuck_bulk(db, items):
+        started.set()
+        release.wait(5)
+        return bulk_insert(db, items)
+
+    monkeypatch.setattr(crud, "create_logs_bulk", stuck_bulk)
+    writer = AuditWriter(max_batch=10, max_wait=0.01, timeout=0.2)
+
+    first = {}
+    slow = threading.Thread(
+        target=lambda: first.update(row=writer.submit({"prompt": "log-slow"}))
+    )
+    slow.start()
+    assert started.wait(5)
+
+    try:
+        with pytest.raises(FutureTimeoutError):
+            writer.submit({"prompt": "log-late"})
+    finally:
+        release.set()
+    slow.join(5)
+
+    # The write already in progress still completes for its caller
+    assert first["row"].id == "log-slow"
+    assert writer.submit({"prompt": "log-next"}).id == "log-next"
+    assert "log-late" not in [p for call in bulk_insert.calls for p in call]
+
+    print("[PASS] Timed-out log was dropped")
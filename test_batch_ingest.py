@@ -0,0 +1,70 @@
+"""
+Unit Tests: Bulk Audit Log Ingestion
+Tests for POST /audit/logs/batch with the database mocked out
+"""
+
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+def _log(i):
+    return {
+        "tenant_id": "t",
+        "agent_id": "a",
+        "session_id": "s",
+        "channel": "api",
+        "prompt": f"prompt {i}",
+        "response": f"response {i}",
+    }
+
+
+@pytest.fixture
+def client(monkeypatch):
+    inserted = []
+
+    def create_logs_bulk(db, items):
+        inserted.append(len(items))
+        return [
+            SimpleNamespace(id=uuid.uuid4(), timestamp=datetime(2024, 1, 1))
+            for _ in items
+        ]
+
+    monkeypatch.setattr(main, "create_logs_bulk", create_logs_bulk)
+    monkeypatch.setattr(main, "scan_and_store_pii_batch", lambda jobs: None)
+    main.app.dependency_overrides[main.get_db] = lambda: None
+    yield TestClient(main.app), inserted
+    main.app.dependency_overrides.clear()
+
+
+def test_batch_is_inserted_in_one_call(client):
+    """A batch within the cap is written with one bulk insert."""
+    print("[TEST] Posting a batch of audit logs...")
+
+    test_client, inserted = client
+    response = test_client.post("/audit/logs/batch", json=[_log(i) for i in range(3)])
+
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+    assert inserted == [3]
+
+    print("[PASS] Batch written in one insert")
+
+
+def test_oversized_batch_is_rejected(client):
+    """More than AUDIT_WRITE_MAX_BATCH logs is a 422 and nothing is written."""
+    print("[TEST] Posting a batch over the size cap...")
+
+    test_client, inserted = client
+    logs = [_log(i) for i in range(main.AUDIT_WRITE_MAX_BATCH + 1)]
+    response = test_client.post("/audit/logs/batch", json=logs)
+
+    assert response.status_code == 422
+    assert inserted == []
+
+    print("[PASS] Oversized batch rejected")
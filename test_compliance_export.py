@@ -0,0 +1,27 @@
+"""
+Unit Tests: Compliance Export ZIP
+Tests for how entries are written to the streamed (non-seekable) archive
+"""
+
+import io
+import zipfile
+
+from compliance_export import _ChunkBuffer, _write_small
+
+
+def test_small_entries_are_not_stored_with_data_descriptor():
+    """STORED + data descriptor breaks streaming readers; small entries deflate."""
+    print("[TEST] Writing a small entry to the streamed export ZIP...")
+
+    sink = _ChunkBuffer()
+    digests = {}
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        _write_small(zip_file, "model_info.json", b'{"model": "x"}', digests)
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(sink.drain())))
+
+    info = archive.getinfo("model_info.json")
+    assert info.compress_type == zipfile.ZIP_DEFLATED
+    assert archive.read("model_info.json") == b'{"model": "x"}'
+    assert set(digests) == {"model_info.json"}
+
+    print("[PASS] Small entry deflated and readable")
@@ -8,6 +8,8 @@ Performs Named Entity Recognition (NER)
 
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import List, Dict
 from dotenv import load_dotenv
 
@@ -34,6 +36,23 @@ HEADERS = {
     "Content-Type": "application/json",
 }
 
+# One session so the prompt and response calls reuse the TLS connection
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(
+            total=2,
+            backoff_factor=0.2,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=None,  # NER inference POSTs are safe to retry
+        ),
+    ),
+)
+SESSION.headers.update(HEADERS)
+
 # =========================
 # NER Function
 # =========================
@@ -49,7 +68,7 @@ def perform_ner(text: str) -> List[Dict]:
 
     payload = {"inputs": text[:512]}  # HF inference safety limit
 
-    response = requests.post(HF_API_URL, headers=HEADERS, json=payload, timeout=10)
+    response = SESSION.post(HF_API_URL, json=payload, timeout=10)
 
     if response.status_code != 200:
         raise RuntimeError(f"HF API Error {response.status_code}: {response.text}")
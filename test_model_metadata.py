@@ -6,7 +6,7 @@ Tests for metadata persistence, export, and retrieval
 import json
 from datetime import datetime
 from schemas import AuditLogCreate
-from crud import create_log
+from crud import create_logs_bulk
 from models import ConversationAuditLog
 
 
@@ -32,7 +32,7 @@ def test_audit_log_with_model_metadata():
     )
 
     print("[TEST] Creating audit log with model metadata...")
-    print(f"  Payload: {log_data.dict()}")
+    print(f"  Payload: {log_data.model_dump(by_alias=True)}")
 
     # Verify all fields are present
     assert log_data.model_provider == "openai"
@@ -40,7 +40,7 @@ def test_audit_log_with_model_metadata():
     assert log_data.model_version == "2024-04-09"
     assert log_data.temperature == "0.7"
     assert log_data.safety_mode == "strict"
-    assert log_data.model_config["top_p"] == 0.9
+    assert log_data.provider_config["top_p"] == 0.9
 
     print("[PASS] Audit log metadata validation passed")
     return True
@@ -0,0 +1,166 @@
+"""
+Unit Tests: Keyset Pagination
+Tests for cursor encoding and paging through /audit/logs
+"""
+
+import base64
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import orjson
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+from main import _decode_cursor, _encode_cursor
+
+
+class FakeQuery:
+    """Stands in for a SQLAlchemy query; every chained call returns itself."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.filters = []
+
+    def filter(self, *criteria):
+        self.filters.extend(criteria)
+        return self
+
+    def with_entities(self, *entities):
+        return self
+
+    def order_by(self, *clauses):
+        return self
+
+    def limit(self, limit):
+        self.rows = self.rows[:limit]
+        return self
+
+    def offset(self, offset):
+        return self
+
+    def scalar(self):
+        return len(self.rows)
+
+    def all(self):
+        return list(self.rows)
+
+
+def _client(rows):
+    query = FakeQuery(rows)
+    main.app.dependency_overrides[main.get_db] = lambda: SimpleNamespace(
+        query=lambda *args: query
+    )
+    return TestClient(main.app), query
+
+
+@pytest.fixture(autouse=True)
+def _clear_overrides():
+    yield
+    main.app.dependency_overrides.clear()
+
+
+def _rows(count):
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    return [
+        SimpleNamespace(id=uuid.uuid4(), timestamp=start - timedelta(minutes=i))
+        for i in range(count)
+    ]
+
+
+def test_cursor_round_trip():
+    """A cursor decodes back to the (timestamp, id) it was built from."""
+    print("[TEST] Round-tripping a keyset cursor...")
+
+    timestamp = datetime(2024, 1, 1, 8, 30, 15, 123456)
+    row_id = uuid.uuid4()
+    assert _decode_cursor(_encode_cursor(timestamp, row_id)) == (timestamp, row_id)
+
+    print("[PASS] Cursor round trip works")
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        b"not json",
+        orjson.dumps(["2024-01-01T00:00:00"]),
+        orjson.dumps(["2024-01-01T00:00:00", 5]),
+        orjson.dumps([5, str(uuid.uuid4())]),
+        orjson.dumps(["2024-01-01T00:00:00", "not-a-uuid"]),
+    ],
+)
+def test_malformed_cursor_is_rejected(payload):
+    """Anything that is not [iso timestamp, uuid string] is a 400, not a 500."""
+    print("[TEST] Decoding a malformed cursor...")
+
+    with pytest.raises(HTTPException) as exc:
+        _decode_cursor(base64.urlsafe_b64encode(payload).decode("ascii"))
+    assert exc.value.status_code == 400
+
+    print("[PASS] Malformed cursor rejected with 400")
+
+
+def test_full_page_returns_next_cursor():
+    """A full page hands back a cursor pointing at its last row."""
+    print("[TEST] Paging through logs with a cursor...")
+
+    rows = _rows(5)
+    client, query = _client(rows)
+    body = client.get("/audit/logs", params={"tenant_id": "t", "limit": 3}).json()
+
+    assert len(body["logs"]) == 3
+    assert _decode_cursor(body["next_cursor"]) == (rows[2].timestamp, rows[2].id)
+
+    client.get(
+        "/audit/logs",
+        params={"tenant_id": "t", "limit": 3, "cursor": body["next_cursor"]},
+    )
+    assert len(query.filters) == 3  # tenant filter twice, then the keyset filter
+
+    print("[PASS] Next cursor points at the last row of the page")
+
+
+def test_short_and_empty_pages_have_no_cursor():
+    """The last page (short or empty) ends the walk with next_cursor=None."""
+    print("[TEST] Checking the final page of logs...")
+
+    for count in (2, 0):
+        client, _ = _client(_rows(count))
+        response = client.get("/audit/logs", params={"tenant_id": "t", "limit": 3})
+        assert response.status_code == 200
+        assert response.json()["next_cursor"] is None
+
+    print("[PASS] Final page carries no cursor")
+
+
+def test_garbage_cursor_is_a_client_error():
+    """A cursor that is not base64 JSON never reaches the database."""
+    print("[TEST] Requesting logs with a garbage cursor...")
+
+    client, _ = _client(_rows(3))
+    response = client.get("/audit/logs", params={"tenant_id": "t", "cursor": "%%%"})
+    assert response.status_code == 400
+
+    print("[PASS] Garbage cursor rejected with 400")
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"limit": 0},
+        {"limit": -1},
+        {"limit": 1001},
+        {"offset": -1},
+    ],
+)
+def test_out_of_range_paging_params_are_rejected(params):
+    """limit outside 1..1000 or a negative offset is a 422, not a database error."""
+    print(f"[TEST] Requesting logs with {params}...")
+
+    client, _ = _client(_rows(3))
+    response = client.get("/audit/logs", params={"tenant_id": "t", **params})
+    assert response.status_code == 422
+
+    print("[PASS] Out-of-range paging params rejected")
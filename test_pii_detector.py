@@ -0,0 +1,461 @@
+"""
+Unit Tests: PII Detector NER Pipeline
+Tests for NER batching, the response cache, the HF circuit breaker and
+per-field tagging, with the HuggingFace API mocked out
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import orjson
+import pytest
+import requests
+
+import pii_detector
+from pii_detector import (
+    NerBatcher,
+    clear_ner_cache,
+    inspect_text_for_pii,
+    query_hf_ner,
+    query_hf_ner_batch,
+    scan_audit_log_for_pii,
+    scan_audit_logs_for_pii,
+)
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.status_code = status_code
+        self.content = orjson.dumps(body)
+        self.text = self.content.decode()
+
+
+def _entities(text):
+    """One ORG entity named after the text's first word."""
+    return [{"entity_group": "ORG", "word": text.split()[0], "score": 0.9}]
+
+
+class FakeHF:
+    """Records every POST and answers like the HF router."""
+
+    def __init__(self):
+        self.calls = []
+        self.mode = "ok"
+        self._lock = threading.Lock()
+
+    def post(self, url, data, timeout, headers=None):
+        inputs = orjson.loads(data)["inputs"]
+        with self._lock:
+            self.calls.append(inputs)
+        if self.mode == "timeout":
+            raise requests.exceptions.Timeout()
+        if self.mode == "server_error":
+            return FakeResponse({"error": "unavailable"}, status_code=503)
+        if self.mode == "bad_request":
+            return FakeResponse({"error": "bad input"}, status_code=400)
+        if self.mode == "rate_limited":
+            return FakeResponse({"error": "rate limit reached"}, status_code=429)
+        if self.mode == "loading" and len(inputs) > 1:
+            return FakeResponse({"error": "Model is currently loading"})
+        if len(inputs) == 1:
+            return FakeResponse(_entities(inputs[0]))
+        return FakeResponse([_entities(text) for text in inputs])
+
+    @property
+    def texts_sent(self):
+        return [text for inputs in self.calls for text in inputs]
+
+
+@pytest.fixture(autouse=True)
+def fake_hf(monkeypatch):
+    fake = FakeHF()
+    monkeypatch.setattr(pii_detector, "HF_API_TOKEN", "test-token")
+    monkeypatch.setattr(pii_detector, "NER_LOCAL_MODEL", None)
+    monkeypatch.setattr(pii_detector._SESSION, "post", fake.post)
+    monkeypatch.setitem(pii_detector._hf_state, "failures", 0)
+    monkeypatch.setitem(pii_detector._hf_state, "opened_at", 0.0)
+    clear_ner_cache()
+    yield fake
+    clear_ner_cache()
+
+
+# ---------- Batching ----------
+
+
+def test_single_query_gets_its_own_entities(fake_hf):
+    """A lone call is sent as a one-input batch and unwrapped for the caller."""
+    print("[TEST] Querying NER for one text...")
+
+    findings, raw = query_hf_ner("Acme shipped the order")
+
+    assert fake_hf.calls == [["Acme shipped the order"]]
+    assert raw == _entities("Acme shipped the order")
+    assert [item["value"] for item in findings] == ["Acme"]
+
+    print("[PASS] Single query answered from a one-input batch")
+
+
+def test_batch_call_sends_one_request(fake_hf):
+    """Texts queued together share a POST and each gets its own entities."""
+    print("[TEST] Sending several texts through query_hf_ner_batch...")
+
+    texts = ["Acme shipped the order", "Globex called back", "Initech sent a fax"]
+    results = query_hf_ner_batch(texts)
+
+    assert len(fake_hf.calls) == 1
+    assert [raw for _, raw in results] == [_entities(text) for text in texts]
+    assert [findings[0]["value"] for findings, _ in results] == [
+        "Acme",
+        "Globex",
+        "Initech",
+    ]
+
+    print("[PASS] Batched texts shared one request")
+
+
+def test_audit_scan_sends_prompt_and_response_together(fake_hf):
+    """One audit log scan is one POST with both texts."""
+    print("[TEST] Scanning one audit log...")
+
+    result = scan_audit_log_for_pii("Acme shipped the order", "Globex called back")
+
+    assert fake_hf.calls == [["Acme shipped the order", "Globex called back"]]
+    assert result["ner_response_prompt"] == _entities("Acme shipped the order")
+    assert result["ner_response_response"] == _entities("Globex called back")
+
+    print("[PASS] Prompt and response shared one request")
+
+
+def test_concurrent_callers_are_coalesced(fake_hf):
+    """Callers on different threads land in the same batch."""
+    print("[TEST] Submitting NER calls from several threads at once...")
+
+    batcher = NerBatcher(max_batch=32, max_wait=0.2)
+    barrier = threading.Barrier(8)
+    results = {}
+
+    def call(i):
+        barrier.wait()
+        results[i] = batcher.submit(f"Company{i} filed a report")
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(fake_hf.calls) < 8
+    assert sorted(fake_hf.texts_sent) == sorted(
+        f"Company{i} filed a report" for i in range(8)
+    )
+    assert all(results[i] == _entities(f"Company{i} filed a report") for i in range(8))
+
+    print(f"[PASS] 8 callers shared {len(fake_hf.calls)} request(s)")
+
+
+def test_batches_are_capped_at_max_batch(fake_hf):
+    """A backlog larger than max_batch is split across requests."""
+    print("[TEST] Submitting more texts than one batch holds...")
+
+    batcher = NerBatcher(max_batch=4, max_wait=0.2)
+    barrier = threading.Barrier(10)
+
+    def call(i):
+        barrier.wait()
+        batcher.submit(f"Company{i} filed a report")
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert all(len(inputs) <= 4 for inputs in fake_hf.calls)
+    assert len(fake_hf.texts_sent) == 10
+
+    print(f"[PASS] 10 texts went out in {len(fake_hf.calls)} capped request(s)")
+
+
+def test_scan_of_many_logs_respects_max_batch(fake_hf):
+    """40 logs (80 texts) go out in 3 requests of at most NER_MAX_BATCH inputs."""
+    print("[TEST] Scanning 40 audit logs at once...")
+
+    logs = [(f"Prompt{i} about billing", f"Reply{i} with details") for i in range(40)]
+    results = scan_audit_logs_for_pii(logs)
+
+    assert sorted(len(inputs) for inputs in fake_hf.calls) == [16, 32, 32]
+    assert results[7]["ner_response_prompt"] == _entities("Prompt7 about billing")
+    assert results[7]["ner_response_response"] == _entities("Reply7 with details")
+
+    print("[PASS] 40 logs scanned in 3 requests")
+
+
+def test_slow_batch_does_not_block_the_next(fake_hf, monkeypatch):
+    """With two workers, a second batch goes out while the first is still waiting."""
+    print("[TEST] Sending two batches that must be in flight together...")
+
+    rendezvous = threading.Barrier(2, timeout=2)
+
+    def post(url, data, timeout, headers=None):
+        rendezvous.wait()  # Breaks unless both requests are in flight at once
+        return fake_hf.post(url, data, timeout, headers)
+
+    monkeypatch.setattr(pii_detector._SESSION, "post", post)
+    batcher = NerBatcher(max_batch=1, max_wait=0.01, workers=2)
+    futures = batcher.enqueue(["Acme shipped the order", "Globex called back"])
+
+    assert [future.result(5) for future in futures] == [
+        _entities("Acme shipped the order"),
+        _entities("Globex called back"),
+    ]
+
+    print("[PASS] Two batches were in flight at once")
+
+
+def test_scan_gives_up_on_slow_ner(fake_hf, monkeypatch):
+    """Past NER_RESULT_TIMEOUT_SECONDS a scan returns regex-only findings."""
+    print("[TEST] Scanning while the NER request hangs...")
+
+    release = threading.Event()
+
+    def post(url, data, timeout, headers=None):
+        release.wait(5)
+        return fake_hf.post(url, data, timeout, headers)
+
+    monkeypatch.setattr(pii_detector._SESSION, "post", post)
+    monkeypatch.setattr(pii_detector, "NER_RESULT_TIMEOUT_SECONDS", 0.2)
+
+    try:
+        started = time.monotonic()
+        findings, raw = inspect_text_for_pii("Write to bob@example.com today")
+        elapsed = time.monotonic() - started
+    finally:
+        release.set()
+
+    assert raw is None
+    assert [item["type"] for item in findings] == ["email"]
+    assert elapsed < 1
+
+    print(f"[PASS] Fell back to regex after {elapsed:.2f}s")
+
+
+def test_non_list_batch_reply_is_retried_per_text(fake_hf):
+    """An error dict for a batch is not copied to every text."""
+    print("[TEST] Handling a 'model loading' reply for a batch...")
+
+    fake_hf.mode = "loading"
+    texts = ["Acme shipped the order", "Globex called back"]
+    results = query_hf_ner_batch(texts)
+
+    assert [len(inputs) for inputs in fake_hf.calls] == [2, 1, 1]
+    assert [raw for _, raw in results] == [_entities(text) for text in texts]
+
+    print("[PASS] Batch retried text by text")
+
+
+# ---------- Cache ----------
+
+
+def test_repeated_text_hits_cache(fake_hf):
+    """A text seen before is answered without another request."""
+    print("[TEST] Querying the same text twice...")
+
+    first = query_hf_ner("Acme shipped the order")
+    second = query_hf_ner("Acme shipped the order")
+
+    assert len(fake_hf.calls) == 1
+    assert first == second
+
+    clear_ner_cache()
+    query_hf_ner("Acme shipped the order")
+    assert len(fake_hf.calls) == 2
+
+    print("[PASS] Cache hit skipped the request; clear_ner_cache() resets it")
+
+
+def test_cache_evicts_least_recently_used(fake_hf, monkeypatch):
+    """Past NER_CACHE_SIZE entries, the least recently used text is dropped."""
+    print("[TEST] Filling a two-entry NER cache...")
+
+    monkeypatch.setattr(pii_detector, "NER_CACHE_SIZE", 2)
+    query_hf_ner("Alpha text one")
+    query_hf_ner("Bravo text two")
+    query_hf_ner("Alpha text one")  # hit: Alpha becomes most recent
+    query_hf_ner("Charlie text three")  # evicts Bravo
+    assert len(fake_hf.calls) == 3
+
+    query_hf_ner("Alpha text one")
+    assert len(fake_hf.calls) == 3
+    query_hf_ner("Bravo text two")
+    assert len(fake_hf.calls) == 4
+
+    print("[PASS] Least recently used entry was evicted")
+
+
+def test_failures_are_not_cached(fake_hf):
+    """A failed call returns no raw response and is retried next time."""
+    print("[TEST] Querying a text while the API returns 503...")
+
+    fake_hf.mode = "server_error"
+    assert query_hf_ner("Acme shipped the order") == ([], None)
+
+    fake_hf.mode = "ok"
+    findings, raw = query_hf_ner("Acme shipped the order")
+    assert raw == _entities("Acme shipped the order")
+    assert len(fake_hf.calls) == 2
+
+    print("[PASS] Failure was not cached")
+
+
+# ---------- Circuit breaker ----------
+
+
+def test_breaker_opens_cools_down_and_recovers(fake_hf, monkeypatch):
+    """Consecutive failures skip the API until a trial call after the cooldown succeeds."""
+    print("[TEST] Driving the HF circuit breaker through a full cycle...")
+
+    monkeypatch.setattr(pii_detector, "NER_BREAKER_FAILURES", 3)
+    monkeypatch.setattr(pii_detector, "NER_BREAKER_COOLDOWN_SECONDS", 0.2)
+    fake_hf.mode = "timeout"
+
+    for i in range(3):
+        query_hf_ner(f"Failing call {i}")
+    assert len(fake_hf.calls) == 3
+
+    # Open: no request, regex findings still come back
+    findings, raw = inspect_text_for_pii("Write to bob@example.com today")
+    assert len(fake_hf.calls) == 3
+    assert raw is None
+    assert [item["type"] for item in findings] == ["email"]
+
+    # Trial after the cooldown fails, so the breaker reopens at once
+    time.sleep(0.25)
+    query_hf_ner("Trial call one")
+    query_hf_ner("Skipped while open")
+    assert len(fake_hf.calls) == 4
+
+    # A successful trial closes it
+    time.sleep(0.25)
+    fake_hf.mode = "ok"
+    assert query_hf_ner("Trial call two")[1] == _entities("Trial call two")
+    assert pii_detector._hf_state["failures"] == 0
+    query_hf_ner("Back to normal")
+    assert len(fake_hf.calls) == 6
+
+    print("[PASS] Breaker opened, cooled down and recovered")
+
+
+def test_client_errors_do_not_move_breaker(fake_hf, monkeypatch):
+    """A plain 4xx is about the request: it neither counts nor resets failures."""
+    print("[TEST] Sending requests the API rejects with 400...")
+
+    monkeypatch.setattr(pii_detector, "NER_BREAKER_FAILURES", 2)
+    fake_hf.mode = "bad_request"
+    for i in range(4):
+        query_hf_ner(f"Rejected call {i}")
+    assert len(fake_hf.calls) == 4
+    assert pii_detector._hf_state["failures"] == 0
+
+    fake_hf.mode = "timeout"
+    query_hf_ner("Failing call")
+    fake_hf.mode = "bad_request"
+    query_hf_ner("Rejected call after a failure")
+    assert pii_detector._hf_state["failures"] == 1
+
+    print("[PASS] 4xx responses left the breaker untouched")
+
+
+def test_rate_limiting_opens_breaker(fake_hf, monkeypatch):
+    """429s are an outage for our purposes and open the breaker."""
+    print("[TEST] Sending requests while the API rate limits us...")
+
+    monkeypatch.setattr(pii_detector, "NER_BREAKER_FAILURES", 2)
+    fake_hf.mode = "rate_limited"
+    for i in range(4):
+        query_hf_ner(f"Throttled call {i}")
+
+    assert len(fake_hf.calls) == 2
+    assert pii_detector._hf_breaker_open()
+
+    print("[PASS] 429 responses opened the breaker")
+
+
+def test_read_timeout_is_not_retried(fake_hf, monkeypatch, caplog):
+    """Through the real session adapter, a slow reply costs one timeout, not three."""
+    print("[TEST] Posting to a backend slower than NER_TIMEOUT_SECONDS...")
+
+    hits = []
+
+    class SlowHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            hits.append(self.path)
+            time.sleep(1)
+            try:
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(b"[]")
+            except OSError:
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # Real post() over the production adapter, pointed at the local server
+    session = pii_detector._SESSION
+    monkeypatch.delattr(session, "post")
+    monkeypatch.setattr(session, "adapters", OrderedDict(session.adapters))
+    session.mount("http://", session.get_adapter("https://"))
+    monkeypatch.setattr(
+        pii_detector, "HF_API_URL", f"http://127.0.0.1:{server.server_port}/ner"
+    )
+    monkeypatch.setattr(pii_detector, "NER_TIMEOUT_SECONDS", 0.3)
+
+    try:
+        started = time.monotonic()
+        with caplog.at_level("WARNING", logger="pii_detector"):
+            assert pii_detector._post_ner_batch(["Acme shipped the order"]) == [None]
+        elapsed = time.monotonic() - started
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(hits) == 1
+    assert elapsed < 0.9
+    assert "HF API timeout" in caplog.text
+    assert pii_detector._hf_state["failures"] == 1
+
+    print(f"[PASS] Timed out once in {elapsed:.2f}s")
+
+
+# ---------- Per-field tagging ----------
+
+
+def test_findings_are_tagged_with_their_field(fake_hf):
+    """Each finding records whether it came from the prompt or the response."""
+    print("[TEST] Scanning an audit log for per-field findings...")
+
+    result = scan_audit_log_for_pii(
+        "Contact bob@example.com or bob@example.com",
+        "Call 555-123-4567 about bob@example.com",
+    )
+    tagged = {
+        (item["field"], item["type"], item["value"]) for item in result["pii_list"]
+    }
+
+    assert tagged == {
+        ("prompt", "email", "bob@example.com"),
+        ("prompt", "ORG", "Contact"),
+        ("response", "phone", "555-123-4567"),
+        ("response", "email", "bob@example.com"),
+        ("response", "ORG", "Call"),
+    }
+    assert result["total_pii_found"] == 5
+    assert inspect_text_for_pii("Mail bob@example.com")[0][0].get("field") is None
+
+    print("[PASS] Findings carry their field; duplicates are dropped per field")